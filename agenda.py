@@ -0,0 +1,192 @@
+from bisect import bisect_left
+from datetime import date, timedelta
+import heapq
+from operator import itemgetter
+import pandas as pd
+import streamlit as st
+from perfil import medir, medido
+from armazenamento import AULAS_CSV, EVENTOS_CSV, ATIVIDADES_RECORRENTES_CSV, colunas_aulas, colunas_eventos, colunas_atividades_recorrentes
+
+# --- Constantes ---
+ICON_MAP = {"Prova": "📝", "Trabalho": "💼", "Consulta": "🩺", "Estudo": "📚", "Lembrete": "📌", "Exercício": "🏋️‍♀️", "Outro": "✨"}
+CORES_EVENTOS = {"Prova": "#FF4B4B", "Trabalho": "#FFA500", "Consulta": "#1E90FF", "Estudo": "#32CD32", "Lembrete": "#9370DB", "Exercício": "#3CB371", "Outro": "#D3D3D3"}
+COR_PADRAO = "#808080"
+TIPOS_EVENTOS = ["Prova", "Trabalho", "Consulta", "Lembrete"]
+TIPOS_RECORRENTES = ["Estudo", "Exercício", "Lembrete", "Outro"]
+MARGEM_MINIMA = timedelta(days=60) # Como antes, ao menos 60 dias adiante já expandidos (e o mesmo para trás)
+VISOES_CALENDARIO = {"Semana": "timeGridWeek", "Mês": "dayGridMonth", "Dia": "timeGridDay"}
+
+
+# --- Intervalo Visível do Calendário ---
+# O streamlit-calendar não avisa quando o usuário troca de semana ou de mês, então a navegação fica no
+# Streamlit: o app escolhe a data e a visão, e o componente é montado nelas (initialDate/initialView)
+def intervalo_visivel(data, visao):
+    if visao == "Mês":
+        inicio = data.replace(day=1)
+        return (inicio, (inicio + timedelta(days=32)).replace(day=1))
+    if visao == "Semana":
+        inicio = data - timedelta(days=data.weekday())
+        return (inicio, inicio + timedelta(days=7))
+    return (data, data + timedelta(days=1))
+
+def navegar(data, visao, passo):
+    # Data de referência uma semana, um mês ou um dia antes (passo=-1) ou depois (passo=1)
+    if visao == "Mês":
+        mes = data.month - 1 + passo
+        return date(data.year + mes // 12, mes % 12 + 1, 1)
+    return data + timedelta(days=passo * (7 if visao == "Semana" else 1))
+
+def intervalo_expansao(intervalo):
+    inicio, fim = intervalo
+    margem = max(fim - inicio, MARGEM_MINIMA)
+    return (inicio - margem, fim + margem)
+
+
+# --- Expansão de Ocorrências ---
+def expandir_recorrentes(df, inicio, fim):
+    # Cruza as linhas semanais com os dias do intervalo [inicio, fim) de uma vez só
+    datas = pd.date_range(inicio, fim, freq="D", inclusive="left")
+    dias = pd.DataFrame({"dia_semana": datas.day_name(), "data": datas.strftime("%Y-%m-%d")})
+    if df.empty or dias.empty:
+        return df.iloc[0:0].assign(data=pd.Series(dtype=str))
+    return df.assign(dia_semana=df["dia_semana"].astype(str)).merge(dias, on="dia_semana", how="inner")
+
+def _horario(datas, horas, sufixo="", padrao=None):
+    # Sem horário, usa a própria data (ou o início, para o término)
+    return (datas + "T" + horas + sufixo).where(horas != "", datas if padrao is None else padrao)
+
+def _inicio_fim(df, sufixo=""):
+    inicio = _horario(df["data"], df["hora_inicio"], sufixo)
+    return inicio, _horario(df["data"], df["hora_fim"], sufixo, padrao=inicio)
+
+@medido("calendário: expandir ocorrências")
+def eventos_calendario(df_eventos, df_aulas, df_tarefas, df_atividades_recorrentes, inicio, fim):
+    # Compromissos avulsos e ocorrências semanais só dentro de [inicio, fim): a navegação é feita pelo Streamlit,
+    # então o componente nunca mostra nada fora do intervalo expandido
+    eventos = df_eventos[(df_eventos["data"] >= pd.Timestamp(inicio)) & (df_eventos["data"] < pd.Timestamp(fim))]
+    eventos = eventos.assign(data=eventos["data"].dt.strftime("%Y-%m-%d"), tipo=eventos["tipo"].astype(str))
+    aulas = expandir_recorrentes(df_aulas, inicio, fim)
+    tarefas = expandir_recorrentes(df_tarefas, inicio, fim)
+    atividades = expandir_recorrentes(df_atividades_recorrentes, inicio, fim)
+    atividades = atividades.assign(tipo=atividades["tipo"].astype(str))
+
+    inicio_eventos, fim_eventos = _inicio_fim(eventos, ":00")
+    inicio_aulas, fim_aulas = _inicio_fim(aulas)
+    inicio_atividades, fim_atividades = _inicio_fim(atividades)
+    partes = [
+        pd.DataFrame({"title": eventos["tipo"] + ": " + eventos["titulo"], "start": inicio_eventos, "end": fim_eventos,
+                      "color": eventos["tipo"].map(CORES_EVENTOS).fillna(COR_PADRAO)}),
+        pd.DataFrame({"title": "Aula: " + aulas["disciplina"], "start": inicio_aulas, "end": fim_aulas, "color": "#4B0082"}),
+        pd.DataFrame({"title": "Casa: " + tarefas["tarefa"], "start": tarefas["data"], "end": tarefas["data"], "color": "#2E8B57", "allDay": True}),
+        pd.DataFrame({"title": atividades["tipo"] + ": " + atividades["titulo"], "start": inicio_atividades, "end": fim_atividades,
+                      "color": atividades["tipo"].map(CORES_EVENTOS).fillna(COR_PADRAO)}),
+    ]
+    return [registro for parte in partes for registro in parte.to_dict("records")]
+
+
+# ==========================================================
+# ÍNDICE DA AGENDA DIÁRIA
+# ==========================================================
+FIM_DO_DIA = 24 * 60 # Horários inválidos vão para o fim da agenda
+
+def minutos(horas):
+    # As horas já chegam no formato canônico "HH:MM" (ver ESQUEMAS em armazenamento.py)
+    return (pd.to_numeric(horas.str.slice(0, 2), errors="coerce") * 60 + pd.to_numeric(horas.str.slice(3, 5), errors="coerce")).fillna(FIM_DO_DIA).astype(int)
+
+def minuto(hora):
+    return int(hora[:2]) * 60 + int(hora[3:5])
+
+def _itens(df, chave, tipo, titulo, icone):
+    inicio = minutos(df["hora_inicio"])
+    # Sem término (ou com término antes do início), o item ocupa só o minuto em que começa
+    fim = minutos(df["hora_fim"].where(df["hora_fim"] != "", df["hora_inicio"])).clip(lower=inicio + 1)
+    return pd.DataFrame({"chave": chave, "hora_inicio": df["hora_inicio"], "hora_fim": df["hora_fim"], "tipo": tipo,
+                         "titulo": titulo, "icone": icone, "minutos": inicio, "minutos_fim": fim})
+
+def _agrupar(itens):
+    itens = itens.sort_values("minutos", kind="stable")
+    return {chave: grupo.drop(columns="chave").to_dict("records") for chave, grupo in itens.groupby("chave", sort=False)}
+
+class Intervalos:
+    # Itens de um dia ordenados pelo início; a maior duração limita até onde olhar para trás numa consulta
+    def __init__(self, itens):
+        self.itens = [item for item in itens if item["minutos"] < FIM_DO_DIA]
+        self.inicios = [item["minutos"] for item in self.itens]
+        self.maior_duracao = max((item["minutos_fim"] - item["minutos"] for item in self.itens), default=0)
+
+    def sobrepostos(self, inicio, fim):
+        # Tudo que começa em [inicio - maior_duracao, fim) é candidato: duas buscas binárias e só os candidatos são testados
+        primeiro = bisect_left(self.inicios, inicio - self.maior_duracao)
+        ultimo = bisect_left(self.inicios, fim)
+        return [item for item in self.itens[primeiro:ultimo] if item["minutos_fim"] > inicio]
+
+def _marcar_conflitos(itens):
+    # Com os itens ordenados pelo início, um item conflita se começa antes do maior término anterior
+    # ou se termina depois do início do próximo
+    marcados = [dict(item, conflito=False) for item in itens]
+    com_horario = [item for item in marcados if item["minutos"] < FIM_DO_DIA]
+    maior_fim = -1
+    for posicao, item in enumerate(com_horario):
+        proximo = com_horario[posicao + 1]["minutos"] if posicao + 1 < len(com_horario) else FIM_DO_DIA + 1
+        item["conflito"] = item["minutos"] < maior_fim or item["minutos_fim"] > proximo
+        maior_fim = max(maior_fim, item["minutos_fim"])
+    return marcados
+
+class IndiceAgenda:
+    # Itens recorrentes por dia da semana e compromissos únicos por data, já ordenados por horário
+    def __init__(self, df_aulas, df_eventos, df_atividades_recorrentes):
+        eventos = df_eventos[(df_eventos["hora_inicio"] != "") & df_eventos["data"].notna()]
+        tipos_atividades = df_atividades_recorrentes["tipo"].astype(str)
+        tipos_eventos = eventos["tipo"].astype(str)
+        semanais = pd.concat([
+            _itens(df_aulas, df_aulas["dia_semana"].astype(str), "Aula", df_aulas["disciplina"] + " (Sala: " + df_aulas["sala"] + ")", "📚"),
+            _itens(df_atividades_recorrentes, df_atividades_recorrentes["dia_semana"].astype(str), tipos_atividades,
+                   df_atividades_recorrentes["titulo"], tipos_atividades.map(ICON_MAP).fillna("✨")),
+        ], ignore_index=True)
+        unicos = _itens(eventos, eventos["data"].dt.strftime("%Y-%m-%d"), tipos_eventos, eventos["titulo"], tipos_eventos.map(ICON_MAP).fillna("🔔"))
+        self.semanal = _agrupar(semanais)
+        self.por_data = _agrupar(unicos)
+        self.intervalos_semanais = {chave: Intervalos(itens) for chave, itens in self.semanal.items()}
+        self.intervalos_por_data = {chave: Intervalos(itens) for chave, itens in self.por_data.items()}
+        self._dias = {}
+
+    def agenda(self, data):
+        data_str = data.strftime("%Y-%m-%d")
+        if data_str not in self._dias:
+            itens = heapq.merge(self.semanal.get(data.strftime("%A"), []), self.por_data.get(data_str, []), key=itemgetter("minutos"))
+            self._dias[data_str] = _marcar_conflitos(itens)
+        return self._dias[data_str]
+
+    def conflitos(self, inicio, fim, dia_semana=None, data=None):
+        # Itens que se sobrepõem a [inicio, fim), em minutos: os semanais do dia da semana e os únicos da data
+        encontrados = []
+        if dia_semana in self.intervalos_semanais:
+            encontrados += self.intervalos_semanais[dia_semana].sobrepostos(inicio, fim)
+        if data in self.intervalos_por_data:
+            encontrados += self.intervalos_por_data[data].sobrepostos(inicio, fim)
+        return encontrados
+
+@st.cache_resource(max_entries=16)
+def _indice_agenda(_armazenamento, identificador, assinaturas):
+    with medir("agenda: montar índice"):
+        return IndiceAgenda(_armazenamento.carregar(AULAS_CSV, colunas_aulas), _armazenamento.carregar(EVENTOS_CSV, colunas_eventos),
+                            _armazenamento.carregar(ATIVIDADES_RECORRENTES_CSV, colunas_atividades_recorrentes))
+
+def indice_agenda(armazenamento):
+    # Um novo índice só é montado quando alguma das tabelas de origem muda
+    assinaturas = tuple(armazenamento.assinatura(tabela) for tabela in (AULAS_CSV, EVENTOS_CSV, ATIVIDADES_RECORRENTES_CSV))
+    return _indice_agenda(armazenamento, armazenamento.identificador, assinaturas)
+
+def conflitos_horario(armazenamento, hora_inicio, hora_fim="", dia_semana=None, data=None):
+    # hora_inicio/hora_fim em "HH:MM"; data em "AAAA-MM-DD" (o dia da semana dela também é consultado)
+    inicio = minuto(hora_inicio)
+    fim = max(minuto(hora_fim), inicio + 1) if hora_fim else inicio + 1
+    if data is not None:
+        dia_semana = dia_semana or pd.Timestamp(data).strftime("%A")
+    return indice_agenda(armazenamento).conflitos(inicio, fim, dia_semana, data)
+
+def agenda_para(data, armazenamento):
+    with medir("agenda do dia") as registro:
+        itens = indice_agenda(armazenamento).agenda(data)
+        registro["linhas"] = len(itens)
+    return itens
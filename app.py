@@ -1,22 +1,65 @@
 import streamlit as st
 import pandas as pd
-from datetime import datetime, timedelta
+from datetime import date, datetime
 import os
 import random
 import base64
-from streamlit_calendar import calendar
+import glob
+import hashlib
+import io
+import tempfile
+import time
+from armazenamento import (obter_armazenamento, diretorio_usuario, serializar, EdicaoConflitante, COLUNAS, MULTIUSUARIO, AULAS_CSV, EVENTOS_CSV, ATIVIDADES_RECORRENTES_CSV, TAREFAS_CSV, COMPRAS_CSV,
+                           ROTINA_MATINAL_CSV, HABITOS_CSV, MEUS_HABITOS_CSV, HABITOS_FEITOS_CSV, DIARIO_CSV,
+                           colunas_aulas, colunas_eventos, colunas_atividades_recorrentes, colunas_tarefas, colunas_compras,
+                           colunas_rotina_matinal, colunas_habitos, colunas_habitos_feitos, colunas_diario)
+from perfil import definir_pagina, finalizar_rerun, iniciar_rerun, medir
+from estatisticas import HABITO_AGUA, META_AGUA, ROTINA, estatisticas_prontas, historico_mensal, marcacoes, reconstruir, resumo, salvar_dia
+from busca import TABELAS_INDEXADAS, obter_indice
+from calendario_ics import exportar as exportar_ics, importar as importar_ics
+from agenda import ICON_MAP, TIPOS_EVENTOS, TIPOS_RECORRENTES, VISOES_CALENDARIO, agenda_para, conflitos_horario, eventos_calendario, intervalo_expansao, intervalo_visivel, navegar
 
 # --- Configuração da Página ---
 st.set_page_config(page_title="Minha Rotina", page_icon="🧘‍♀️", layout="wide")
+iniciar_rerun()
 
 # --- FUNÇÃO PARA ADICIONAR IMAGEM DE FUNDO ---
-def set_bg_hack(main_bg):
-    main_bg_ext = "png"
+DIRETORIO_ESTATICO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static") # Servido em app/static/ (ver .streamlit/config.toml)
+LARGURA_FUNDO = 1920 # Com background-size: cover, mais pixels que isso não aparecem numa tela comum
+
+@st.cache_resource(max_entries=4)
+def preparar_fundo(caminho, assinatura):
+    # Reduz e converte a imagem uma única vez por versão do arquivo; o nome leva o hash do conteúdo
+    from PIL import Image, features
+    with open(caminho, "rb") as arquivo:
+        conteudo = arquivo.read()
+    formato, extensao = ("WEBP", "webp") if features.check("webp") else ("JPEG", "jpeg")
+    imagem = Image.open(io.BytesIO(conteudo))
+    imagem.thumbnail((LARGURA_FUNDO, LARGURA_FUNDO))
+    saida = io.BytesIO()
+    (imagem if formato == "WEBP" else imagem.convert("RGB")).save(saida, formato, quality=80)
+    dados = saida.getvalue()
+    if not st.get_option("server.enableStaticServing"):
+        # Sem arquivos estáticos, vai embutida, mas já reduzida e codificada só uma vez
+        return f"data:image/{extensao};base64,{base64.b64encode(dados).decode()}"
+    nome = f"fundo-{hashlib.sha256(conteudo).hexdigest()[:16]}.{extensao}"
+    destino = os.path.join(DIRETORIO_ESTATICO, nome)
+    if not os.path.exists(destino):
+        os.makedirs(DIRETORIO_ESTATICO, exist_ok=True)
+        with open(destino + ".tmp", "wb") as arquivo:
+            arquivo.write(dados)
+        os.replace(destino + ".tmp", destino)
+        for antigo in glob.glob(os.path.join(DIRETORIO_ESTATICO, "fundo-*")):
+            if antigo != destino:
+                os.remove(antigo)
+    return f"app/static/{nome}"
+
+def set_bg_hack(url_fundo):
     st.markdown(
          f"""
          <style>
          .stApp {{
-             background: url(data:image/{main_bg_ext};base64,{base64.b64encode(open(main_bg, "rb").read()).decode()});
+             background: url("{url_fundo}");
              background-size: cover;
              background-repeat: no-repeat;
              background-attachment: fixed;
@@ -69,67 +112,250 @@ def set_bg_hack(main_bg):
             background-color: rgba(255, 255, 255, 0.8);
             border-radius: 8px;
          }}
+         .agenda-conflito {{
+            border-left-color: #FF4B4B;
+            background-color: rgba(255, 228, 225, 0.9);
+         }}
          </style>
          """,
          unsafe_allow_html=True
      )
 
 if os.path.exists("background.png"):
-    set_bg_hack("background.png")
-
-# --- Arquivos de Dados ---
-AULAS_CSV = "aulas.csv"
-EVENTOS_CSV = "eventos.csv"
-ATIVIDADES_RECORRENTES_CSV = "atividades_recorrentes.csv"
-TAREFAS_CSV = "tarefas_semanais.csv"
-COMPRAS_CSV = "lista_compras.csv"
-ROTINA_MATINAL_CSV = "rotina_matinal.csv"
-HABITOS_CSV = "habitos.csv"
-MEUS_HABITOS_CSV = "meus_habitos.csv"
-HABITOS_FEITOS_CSV = "habitos_feitos.csv"
-DIARIO_CSV = "diario.csv"
-
+    with medir("imagem de fundo") as registro:
+        estado_fundo = os.stat("background.png")
+        url_fundo = preparar_fundo(os.path.abspath("background.png"), (estado_fundo.st_mtime_ns, estado_fundo.st_size))
+        set_bg_hack(url_fundo)
+        registro["bytes"] = len(url_fundo)
 
 # --- Constantes e Dicionários ---
 FRASES = ["O sucesso é a soma de pequenos esforços repetidos dia após dia.", "Comece onde você está. Use o que você tem. Faça o que você pode.", "Acredite em você mesmo e tudo será possível."]
 DIAS_PT = {"Monday": "Segunda-feira", "Tuesday": "Terça-feira", "Wednesday": "Quarta-feira", "Thursday": "Quinta-feira", "Friday": "Sexta-feira", "Saturday": "Sábado", "Sunday": "Domingo"}
-ICON_MAP = {"Prova": "📝", "Trabalho": "💼", "Consulta": "🩺", "Estudo": "📚", "Lembrete": "📌", "Exercício": "🏋️‍♀️", "Outro": "✨"}
 
 
-# --- Funções Auxiliares ---
-def carregar_csv(caminho, colunas):
-    if not os.path.exists(caminho):
-        return pd.DataFrame(columns=colunas)
-    df = pd.read_csv(caminho, dtype=str).fillna('') # Lê todas as colunas como texto para evitar erros
-    for col in colunas:
-        if col not in df.columns:
-            df[col] = ''
+# --- Usuário (modo multiusuário) ---
+def usuario_atual():
+    # O usuário fica em ?usuario= na URL: o link pode ser salvo e cada aba sabe de quem são os dados
+    usuario = st.query_params.get("usuario", "")
+    if usuario:
+        st.sidebar.caption(f"👤 {usuario}")
+        if st.sidebar.button("Trocar de usuário"):
+            del st.query_params["usuario"]
+            st.rerun()
+        return usuario
+    with st.sidebar.form("form_usuario"):
+        nome = st.text_input("Usuário")
+        if st.form_submit_button("Entrar") and nome.strip():
+            st.query_params["usuario"] = nome.strip()
+            st.rerun()
+    st.info("Informe seu usuário na barra lateral para ver a sua rotina.")
+    st.stop()
+
+# --- Acesso às Tabelas ---
+if MULTIUSUARIO:
+    try:
+        armazenamento = obter_armazenamento(diretorio=diretorio_usuario(usuario_atual()))
+    except ValueError as erro:
+        del st.query_params["usuario"]
+        st.error(str(erro))
+        st.stop()
+else:
+    armazenamento = obter_armazenamento()
+indice_busca = obter_indice(armazenamento.diretorio)
+
+def carregar_tabela(tabela, inicio=None, fim=None):
+    # Cada página (e cada seção de Cadastros) carrega só as tabelas que usa, quando chega nelas
+    return armazenamento.carregar(tabela, COLUNAS[tabela], inicio=inicio, fim=fim)
+
+
+# --- Cadastros: tabelas paginadas, com edição e exclusão em lote ---
+TAMANHOS_PAGINA = [25, 50, 100]
+DIAS_EN = {v: k for k, v in DIAS_PT.items()}
+FORMATO_HORA = r"^([0-9]{2}:[0-9]{2})?$"
+
+def _para_exibicao(df):
+    df = df.copy()
+    for coluna in df.columns:
+        if isinstance(df[coluna].dtype, pd.CategoricalDtype):
+            df[coluna] = df[coluna].astype(str)
+    if "dia_semana" in df.columns:
+        df["dia_semana"] = df["dia_semana"].map(DIAS_PT).fillna(df["dia_semana"])
+    return df
+
+def _de_exibicao(df):
+    if "dia_semana" in df.columns:
+        df = df.assign(dia_semana=df["dia_semana"].map(DIAS_EN).fillna(df["dia_semana"]))
     return df
 
-# --- Inicializar DataFrames ---
-colunas_aulas = ["disciplina", "sala", "dia_semana", "hora_inicio", "hora_fim"]
-colunas_eventos = ["data", "tipo", "titulo", "descricao", "hora_inicio", "hora_fim"]
-colunas_atividades_recorrentes = ["titulo", "tipo", "dia_semana", "hora_inicio", "hora_fim"]
-colunas_rotina_matinal = ["data", "cama_arrumada", "dentes_escovados", "rosto_lavado", "meditacao"]
-colunas_habitos = ["data", "agua"]
-colunas_meus_habitos = ["habito"]
-colunas_habitos_feitos = ["data", "habito", "feito"]
-colunas_diario = ["data", "gratidao", "desafio", "aprendizado", "observacao"]
-
-df_aulas = carregar_csv(AULAS_CSV, colunas_aulas)
-df_eventos = carregar_csv(EVENTOS_CSV, colunas_eventos)
-df_atividades_recorrentes = carregar_csv(ATIVIDADES_RECORRENTES_CSV, colunas_atividades_recorrentes)
-df_tarefas = carregar_csv(TAREFAS_CSV, ["dia_semana", "tarefa"])
-df_compras = carregar_csv(COMPRAS_CSV, ["item", "comprado"])
-df_rotina_matinal = carregar_csv(ROTINA_MATINAL_CSV, colunas_rotina_matinal)
-df_habitos = carregar_csv(HABITOS_CSV, colunas_habitos)
-df_meus_habitos = carregar_csv(MEUS_HABITOS_CSV, colunas_meus_habitos)
-df_habitos_feitos = carregar_csv(HABITOS_FEITOS_CSV, colunas_habitos_feitos)
-df_diario = carregar_csv(DIARIO_CSV, colunas_diario)
+def grade_cadastros(df, tabela, chave, colunas, rotulos, opcoes=None, filtrar_periodo=False):
+    # Filtros e paginação no servidor: o navegador só recebe uma página, e cada lote de edições vira uma gravação
+    opcoes = opcoes or {}
+    visiveis = _para_exibicao(df)
+    filtros = [coluna for coluna in ("tipo", "dia_semana") if coluna in colunas]
+    colunas_filtro = st.columns(len(filtros) + int(filtrar_periodo) or 1)
+    for posicao, coluna in enumerate(filtros):
+        escolhidos = colunas_filtro[posicao].multiselect(f"Filtrar por {rotulos[coluna].lower()}", opcoes.get(coluna) or sorted(visiveis[coluna].unique()), key=f"{chave}_filtro_{coluna}")
+        if escolhidos:
+            visiveis = visiveis[visiveis[coluna].isin(escolhidos)]
+    if filtrar_periodo:
+        periodo = colunas_filtro[-1].date_input("Filtrar por período", value=(), format="DD/MM/YYYY", key=f"{chave}_periodo")
+        if len(periodo) == 2:
+            visiveis = visiveis[(visiveis["data"] >= pd.Timestamp(periodo[0])) & (visiveis["data"] <= pd.Timestamp(periodo[1]))]
+    if visiveis.empty:
+        st.info("Nenhum registro encontrado.")
+        return
+
+    col1, col2 = st.columns(2)
+    tamanho = col1.selectbox("Itens por página", TAMANHOS_PAGINA, key=f"{chave}_tamanho")
+    total_paginas = -(-len(visiveis) // tamanho)
+    pagina = col2.selectbox(f"Página (de {total_paginas})", range(1, total_paginas + 1), key=f"{chave}_pagina")
+    original = visiveis[colunas].iloc[(pagina - 1) * tamanho:pagina * tamanho]
+
+    configuracao = {"excluir": st.column_config.CheckboxColumn("Excluir", default=False)}
+    for coluna in colunas:
+        if coluna == "data":
+            configuracao[coluna] = st.column_config.DateColumn(rotulos[coluna], format="DD/MM/YYYY", required=True)
+        elif coluna == "dia_semana":
+            configuracao[coluna] = st.column_config.SelectboxColumn(rotulos[coluna], options=list(DIAS_PT.values()), required=True)
+        elif coluna in opcoes:
+            configuracao[coluna] = st.column_config.SelectboxColumn(rotulos[coluna], options=opcoes[coluna], required=True)
+        elif coluna.startswith("hora_"):
+            configuracao[coluna] = st.column_config.TextColumn(rotulos[coluna], validate=FORMATO_HORA)
+        else:
+            configuracao[coluna] = st.column_config.TextColumn(rotulos[coluna])
+    editado = st.data_editor(original.assign(excluir=False), key=f"{chave}_editor_{pagina}_{tamanho}", hide_index=True,
+                             column_config=configuracao, column_order=colunas + ["excluir"])
+
+    if st.button("Salvar alterações", key=f"{chave}_salvar"):
+        excluidos = list(editado.index[editado["excluir"]])
+        antes = serializar(_de_exibicao(original), tabela).fillna("").astype(str)
+        depois = serializar(_de_exibicao(editado[colunas]), tabela).fillna("").astype(str)
+        mudancas = antes != depois
+        atualizacoes = {index: {coluna: depois.at[index, coluna] for coluna in colunas if mudancas.at[index, coluna]}
+                        for index in mudancas.index[mudancas.any(axis=1)] if index not in excluidos}
+        if atualizacoes or excluidos:
+            try:
+                armazenamento.alterar_lote(tabela, atualizacoes=atualizacoes, excluidos=excluidos, originais=_de_exibicao(original))
+                st.toast(f"{len(atualizacoes)} alterado(s), {len(excluidos)} excluído(s).", icon="💾")
+            except EdicaoConflitante as erro:
+                st.toast(f"{len(erro.indices)} registro(s) foram alterados ou excluídos em outra sessão; nada foi gravado. Confira e edite de novo.", icon="⚠️")
+        # Gravadas ou descartadas, as edições ficam para trás: com o índice padrão, o editor não percebe que as linhas
+        # mudaram de posição e aplicaria as mesmas marcações (inclusive "Excluir") às linhas que ocuparam o lugar delas
+        st.session_state.pop(f"{chave}_editor_{pagina}_{tamanho}", None)
+        st.rerun()
+
+
+# --- Cadastros: aviso de conflito de horário antes de gravar ---
+def descrever_conflito(item, quando):
+    horario = item["hora_inicio"] + (f" - {item['hora_fim']}" if item["hora_fim"] else "")
+    return f"- {quando}, {horario}: {item['icone']} {item['titulo']}"
+
+def inserir_cadastro(tabela, novas):
+    # Compromissos entram também no índice de busca
+    if tabela in TABELAS_INDEXADAS:
+        indice_busca.gravar(armazenamento, tabela, novas, lambda: armazenamento.inserir(tabela, novas))
+    else:
+        armazenamento.inserir(tabela, novas)
+
+def salvar_ou_avisar(chave, tabela, novas, conflitos, mensagem):
+    # Sem conflitos, grava na hora; com conflitos, guarda as linhas até a confirmação em confirmar_conflitos()
+    if conflitos:
+        st.session_state[f"conflitos_{chave}"] = (novas, conflitos, mensagem)
+        return False
+    inserir_cadastro(tabela, novas)
+    return True
+
+def confirmar_conflitos(chave, tabela):
+    pendente = st.session_state.get(f"conflitos_{chave}")
+    if pendente is None:
+        return
+    novas, conflitos, mensagem = pendente
+    st.warning("⚠️ Esse horário coincide com o que já está agendado:\n" + "\n".join(conflitos))
+    col1, col2 = st.columns(2)
+    if col1.button("Salvar mesmo assim", key=f"confirmar_{chave}"):
+        inserir_cadastro(tabela, novas)
+        del st.session_state[f"conflitos_{chave}"]
+        st.toast(mensagem, icon="✅")
+        st.rerun()
+    if col2.button("Cancelar", key=f"cancelar_{chave}"):
+        del st.session_state[f"conflitos_{chave}"]
+        st.rerun()
+
+
+# --- Lista de Compras: alterações ficam na sessão e são gravadas em lote ---
+INTERVALO_GRAVACAO_COMPRAS = 10 # segundos
+
+def _compras_pendentes():
+    # Separado por diretório de dados, para que nada pendente seja gravado na lista de outro usuário
+    return st.session_state.setdefault(f"compras_pendentes_{armazenamento.identificador[1]}", {"alteracoes": {}, "originais": {}, "novos": [], "desde": None})
+
+def _marcar_item(chave, widget, original=None):
+    pendentes = _compras_pendentes()
+    if isinstance(chave, tuple): # Item adicionado nesta sessão e ainda não gravado
+        pendentes["novos"][chave[1]][1] = st.session_state[widget]
+    else:
+        pendentes["alteracoes"][chave] = st.session_state[widget]
+        pendentes["originais"].setdefault(chave, original) # A linha como estava ao ser marcada, para achá-la na gravação
+    pendentes["desde"] = pendentes["desde"] or time.time()
+
+def gravar_compras(limpar_comprados=False):
+    pendentes = _compras_pendentes()
+    novos = pd.DataFrame([novo for novo in pendentes["novos"] if not (limpar_comprados and novo[1])], columns=colunas_compras)
+    alteracoes = dict(pendentes["alteracoes"])
+    if alteracoes or not novos.empty:
+        originais = pd.DataFrame.from_dict(pendentes["originais"], orient="index", columns=colunas_compras)
+        try:
+            armazenamento.alterar_lote(COMPRAS_CSV, atualizacoes={index: {"comprado": comprado} for index, comprado in alteracoes.items()},
+                                       novas=novos, originais=originais)
+        except EdicaoConflitante as erro:
+            # Itens alterados ou removidos em outra sessão perdem a marcação desta; o resto é gravado
+            st.toast(f"{len(erro.indices)} item(ns) mudaram em outra sessão; confira a lista.", icon="⚠️")
+            armazenamento.alterar_lote(COMPRAS_CSV, atualizacoes={index: {"comprado": comprado} for index, comprado in alteracoes.items() if index not in erro.indices},
+                                       novas=novos, originais=originais)
+    if limpar_comprados:
+        df_compras = carregar_tabela(COMPRAS_CSV)
+        comprados = df_compras[df_compras["comprado"]]
+        if not comprados.empty:
+            try:
+                armazenamento.alterar_lote(COMPRAS_CSV, excluidos=comprados.index, originais=comprados[colunas_compras])
+            except EdicaoConflitante:
+                st.toast("A lista mudou em outra sessão; confira e limpe de novo.", icon="⚠️")
+    pendentes.update(alteracoes={}, originais={}, novos=[], desde=None)
+
+@st.fragment(run_every=INTERVALO_GRAVACAO_COMPRAS)
+def lista_de_compras():
+    # Só este trecho roda de novo a cada toque; o disco é escrito no máximo uma vez por intervalo
+    pendentes = _compras_pendentes()
+    if pendentes["desde"] and time.time() - pendentes["desde"] >= INTERVALO_GRAVACAO_COMPRAS:
+        gravar_compras()
+    with st.form("form_compras", clear_on_submit=True):
+        item = st.text_input("Adicionar item à lista")
+        if st.form_submit_button("Adicionar"):
+            if item:
+                pendentes["novos"].append([item, False])
+                pendentes["desde"] = pendentes["desde"] or time.time()
+                st.toast(f'"{item}" adicionado à lista!', icon="➕")
+    st.markdown("### Itens para comprar:")
+    df_compras = carregar_tabela(COMPRAS_CSV)
+    for index, row in df_compras.iterrows():
+        comprado = pendentes["alteracoes"].get(index, bool(row["comprado"]))
+        st.checkbox(row["item"], value=comprado, key=f"item_{index}", on_change=_marcar_item, args=(index, f"item_{index}", (row["item"], bool(row["comprado"]))))
+    for posicao, (item, comprado) in enumerate(pendentes["novos"]):
+        st.checkbox(item, value=comprado, key=f"item_novo_{posicao}", on_change=_marcar_item, args=(("novo", posicao), f"item_novo_{posicao}"))
+    if (not df_compras.empty or pendentes["novos"]) and st.button("Limpar itens comprados"):
+        gravar_compras(limpar_comprados=True)
+        st.toast("Lista limpa!", icon="🗑️")
+        st.rerun()
 
 
 # --- Menu Lateral Simplificado ---
-menu = st.sidebar.radio("Menu", ["Hoje", "Calendário", "Cadastros", "Lista de Compras"])
+menu = st.sidebar.radio("Menu", ["Hoje", "Calendário", "Cadastros", "Lista de Compras", "Estatísticas", "Busca"])
+definir_pagina(menu)
+
+
+# Ao sair da Lista de Compras, grava o que ainda estiver pendente
+if menu != "Lista de Compras":
+    gravar_compras()
 
 # ==========================================================
 # PÁGINA "HOJE"
@@ -138,31 +364,25 @@ if menu == "Hoje":
     st.title("📅 Minha Rotina")
     hoje_dt = datetime.now()
     hoje_str = hoje_dt.strftime("%Y-%m-%d")
+    hoje = pd.Timestamp(hoje_str)
     dia_semana_en = hoje_dt.strftime("%A")
     dia_semana_pt = DIAS_PT.get(dia_semana_en, dia_semana_en)
 
+    # O histórico é particionado por mês: só a partição do mês atual é lida
+    df_rotina_matinal = carregar_tabela(ROTINA_MATINAL_CSV, inicio=hoje, fim=hoje)
+    df_habitos = carregar_tabela(HABITOS_CSV, inicio=hoje, fim=hoje)
+    df_habitos_feitos = carregar_tabela(HABITOS_FEITOS_CSV, inicio=hoje, fim=hoje)
+    df_diario = carregar_tabela(DIARIO_CSV, inicio=hoje, fim=hoje)
+    df_tarefas = carregar_tabela(TAREFAS_CSV)
+    df_meus_habitos = carregar_tabela(MEUS_HABITOS_CSV)
+
     st.header(f"Resumo de hoje: {dia_semana_pt}, {hoje_dt.strftime('%d/%m/%Y')}")
     random.seed(hoje_dt.toordinal())
     st.markdown(f'<div class="quote-container">"{random.choice(FRASES)}"</div>', unsafe_allow_html=True)
 
-    # --- Montando a Agenda do Dia ---
-    agenda_do_dia = []
-    # 1. Aulas
-    aulas_hoje = df_aulas[df_aulas["dia_semana"].str.strip() == dia_semana_en]
-    for _, aula in aulas_hoje.iterrows():
-        agenda_do_dia.append({"hora_inicio": aula["hora_inicio"], "hora_fim": aula["hora_fim"], "tipo": "Aula", "titulo": f"{aula['disciplina']} (Sala: {aula['sala']})", "icone": "📚"})
-    # 2. Eventos com horário
-    eventos_hoje = df_eventos[df_eventos["data"] == hoje_str]
-    for _, evento in eventos_hoje[eventos_hoje['hora_inicio'] != ''].iterrows():
-        agenda_do_dia.append({"hora_inicio": evento["hora_inicio"], "hora_fim": evento["hora_fim"], "tipo": evento["tipo"], "titulo": f"{evento['titulo']}", "icone": ICON_MAP.get(evento['tipo'], "🔔")})
-    # 3. Atividades Recorrentes com horário
-    atividades_hoje = df_atividades_recorrentes[df_atividades_recorrentes["dia_semana"].str.strip() == dia_semana_en]
-    for _, atividade in atividades_hoje.iterrows():
-        agenda_do_dia.append({"hora_inicio": atividade["hora_inicio"], "hora_fim": atividade["hora_fim"], "tipo": atividade["tipo"], "titulo": atividade["titulo"], "icone": ICON_MAP.get(atividade['tipo'], "✨")})
-
-    # Ordenar a agenda
-    if agenda_do_dia:
-        agenda_do_dia.sort(key=lambda x: datetime.strptime(x['hora_inicio'], '%H:%M').time())
+    # --- Montando a Agenda do Dia (índice já ordenado por horário) ---
+    agenda_do_dia = agenda_para(hoje_dt, armazenamento)
+    eventos_hoje = carregar_tabela(EVENTOS_CSV, inicio=hoje, fim=hoje)
 
     # --- LAYOUT COM COLUNAS ---
     col1, col2 = st.columns(2)
@@ -174,11 +394,14 @@ if menu == "Hoje":
         else:
             for item in agenda_do_dia:
                 horario = f"{item['hora_inicio']}" + (f" - {item['hora_fim']}" if item['hora_fim'] else "")
-                st.markdown(f"""<div class="agenda-item"><strong>{horario}</strong>: {item['icone']} {item['titulo']}</div>""", unsafe_allow_html=True)
+                if item["conflito"]:
+                    st.markdown(f"""<div class="agenda-item agenda-conflito" title="Conflito de horário"><strong>⚠️ {horario}</strong>: {item['icone']} {item['titulo']}</div>""", unsafe_allow_html=True)
+                else:
+                    st.markdown(f"""<div class="agenda-item"><strong>{horario}</strong>: {item['icone']} {item['titulo']}</div>""", unsafe_allow_html=True)
         
         st.subheader("📋 Lembretes e Tarefas da Casa")
         # Tarefas da casa (sem horário)
-        tarefas_de_hoje = df_tarefas[df_tarefas['dia_semana'].str.strip() == dia_semana_en]
+        tarefas_de_hoje = df_tarefas[df_tarefas['dia_semana'] == dia_semana_en]
         for _, tarefa in tarefas_de_hoje.iterrows():
             st.markdown(f"🏠 **Casa:** {tarefa['tarefa']}")
         # Eventos do dia (sem horário)
@@ -193,10 +416,11 @@ if menu == "Hoje":
 
     with col2:
         st.subheader("☀️ Autocuidado Diário")
-        agua = int(df_habitos[df_habitos["data"] == hoje_str]["agua"].iloc[0]) if hoje_str in df_habitos["data"].values else 0
-        if hoje_str in df_rotina_matinal["data"].values:
-            rotina_hoje = df_rotina_matinal[df_rotina_matinal["data"] == hoje_str].iloc[0]
-            cama, dentes, rosto, meditacao = bool(eval(str(rotina_hoje["cama_arrumada"]))), bool(eval(str(rotina_hoje["dentes_escovados"]))), bool(eval(str(rotina_hoje["rosto_lavado"]))), bool(eval(str(rotina_hoje["meditacao"])))
+        agua_hoje = df_habitos.loc[df_habitos["data"] == hoje, "agua"]
+        agua = int(agua_hoje.iloc[0]) if not agua_hoje.empty else 0
+        rotina_hoje = df_rotina_matinal[df_rotina_matinal["data"] == hoje]
+        if not rotina_hoje.empty:
+            cama, dentes, rosto, meditacao = (bool(v) for v in rotina_hoje.iloc[0][colunas_rotina_matinal[1:]])
         else:
             cama, dentes, rosto, meditacao = False, False, False, False
 
@@ -205,7 +429,7 @@ if menu == "Hoje":
         rosto_check = st.checkbox("🧼 Lavar o rosto", value=rosto)
         meditacao_check = st.checkbox("🧘‍♀️ Meditar", value=meditacao)
 
-        meta_agua = 2000
+        meta_agua = META_AGUA
         copo_padrao = st.number_input("⚙️ Tamanho do copo (ml)", 50, 1000, 250, 50)
         c1, c2, c3 = st.columns(3)
         if c1.button(f"💧 Beber 1 copo (+{copo_padrao} ml)"): agua += copo_padrao
@@ -214,32 +438,25 @@ if menu == "Hoje":
         st.progress(min(1.0, agua / meta_agua)); st.write(f"Você já bebeu **{agua} ml** de água hoje. Meta: **{meta_agua} ml**")
 
         habitos_personalizados = df_meus_habitos["habito"].tolist()
-        habitos_feitos_hoje = df_habitos_feitos[df_habitos_feitos["data"] == hoje_str]
+        habitos_feitos_hoje = df_habitos_feitos[df_habitos_feitos["data"] == hoje]
+        feitos_hoje = dict(zip(habitos_feitos_hoje["habito"], habitos_feitos_hoje["feito"]))
         habitos_marcados = {}
         for habito in habitos_personalizados:
-            feito_df = habitos_feitos_hoje[habitos_feitos_hoje["habito"] == habito]
-            feito = bool(eval(str(feito_df["feito"].iloc[0]))) if not feito_df.empty else False
-            habitos_marcados[habito] = st.checkbox(habito, value=feito)
+            habitos_marcados[habito] = st.checkbox(habito, value=bool(feitos_hoje.get(habito, False)))
 
         if st.button("Salvar Autocuidado"):
-            df_rotina_matinal = df_rotina_matinal[df_rotina_matinal["data"] != hoje_str]
             nova_rotina = pd.DataFrame([[hoje_str, cama_check, dentes_check, rosto_check, meditacao_check]], columns=colunas_rotina_matinal)
-            df_rotina_matinal = pd.concat([df_rotina_matinal, nova_rotina], ignore_index=True)
-            df_rotina_matinal.to_csv(ROTINA_MATINAL_CSV, index=False)
-            df_habitos = df_habitos[df_habitos["data"] != hoje_str]
             novo_habito = pd.DataFrame([[hoje_str, agua]], columns=colunas_habitos)
-            df_habitos = pd.concat([df_habitos, novo_habito], ignore_index=True)
-            df_habitos.to_csv(HABITOS_CSV, index=False)
-            df_habitos_feitos = df_habitos_feitos[df_habitos_feitos["data"] != hoje_str]
-            for habito, feito in habitos_marcados.items():
-                novo_feito = pd.DataFrame([[hoje_str, habito, feito]], columns=["data", "habito", "feito"])
-                df_habitos_feitos = pd.concat([df_habitos_feitos, novo_feito], ignore_index=True)
-            df_habitos_feitos.to_csv(HABITOS_FEITOS_CSV, index=False)
+            novos_feitos = pd.DataFrame([[hoje_str, habito, feito] for habito, feito in habitos_marcados.items()], columns=colunas_habitos_feitos)
+            # Estatísticas: aplica só a diferença entre o que estava salvo para hoje e o que foi salvo agora
+            salvar_dia(armazenamento, hoje, {ROTINA_MATINAL_CSV: nova_rotina, HABITOS_CSV: novo_habito, HABITOS_FEITOS_CSV: novos_feitos},
+                       marcacoes(nova_rotina.iloc[0][colunas_rotina_matinal[1:]].to_dict(), agua, habitos_marcados))
             st.toast("Seu autocuidado foi salvo!", icon="💖")
 
         st.subheader("📝 Reflexão do Dia")
-        if hoje_str in df_diario["data"].values:
-            diario_hoje = df_diario[df_diario["data"] == hoje_str].iloc[0]
+        diario_hoje = df_diario[df_diario["data"] == hoje]
+        if not diario_hoje.empty:
+            diario_hoje = diario_hoje.iloc[0]
             gratidao, desafio, aprendizado, obs = diario_hoje["gratidao"], diario_hoje["desafio"], diario_hoje["aprendizado"], diario_hoje["observacao"]
         else:
             gratidao, desafio, aprendizado, obs = "", "", "", ""
@@ -248,39 +465,37 @@ if menu == "Hoje":
         aprendizado_txt = st.text_input("O que você aprendeu de novo hoje?", value=aprendizado)
         obs_txt = st.text_area("Observações gerais:", value=obs)
         if st.button("Salvar Reflexão"):
-            df_diario = df_diario[df_diario["data"] != hoje_str]
             novo_diario = pd.DataFrame([[hoje_str, gratidao_txt, desafio_txt, aprendizado_txt, obs_txt]], columns=colunas_diario)
-            df_diario = pd.concat([df_diario, novo_diario], ignore_index=True)
-            df_diario.to_csv(DIARIO_CSV, index=False)
+            indice_busca.gravar(armazenamento, DIARIO_CSV, novo_diario, lambda: armazenamento.upsert_dia(hoje, {DIARIO_CSV: novo_diario}), por_data=True)
             st.toast("Sua reflexão foi salva!", icon="✨")
 
 # ==========================================================
 # PÁGINA "CALENDÁRIO"
 # ==========================================================
 elif menu == "Calendário":
+    from streamlit_calendar import calendar # O componente só é importado quando a página é aberta
     st.title("🗓️ Calendário e Visão Geral")
-    calendar_events = []
-    cores_eventos = {"Prova": "#FF4B4B", "Trabalho": "#FFA500", "Consulta": "#1E90FF", "Estudo": "#32CD32", "Lembrete": "#9370DB", "Exercício": "#3CB371", "Outro": "#D3D3D3"}
-
-    for _, row in df_eventos.iterrows():
-        start_time = f"{row['data']}T{row['hora_inicio']}:00" if row['hora_inicio'] else row['data']
-        end_time = f"{row['data']}T{row['hora_fim']}:00" if row['hora_fim'] else row['data']
-        calendar_events.append({"title": f"{row['tipo']}: {row['titulo']}", "start": start_time, "end": end_time, "color": cores_eventos.get(row['tipo'], "#808080")})
-
-    hoje = datetime.now()
-    for i in range(60):
-        data_atual = hoje + timedelta(days=i)
-        data_str = data_atual.strftime("%Y-%m-%d")
-        dia_semana_en = data_atual.strftime("%A")
-        
-        for _, aula in df_aulas[df_aulas['dia_semana'] == dia_semana_en].iterrows():
-            calendar_events.append({"title": f"Aula: {aula['disciplina']}", "start": f"{data_str}T{aula['hora_inicio']}", "end": f"{data_str}T{aula['hora_fim']}", "color": "#4B0082"})
-        for _, tarefa in df_tarefas[df_tarefas['dia_semana'] == dia_semana_en].iterrows():
-            calendar_events.append({"title": f"Casa: {tarefa['tarefa']}", "start": data_str, "end": data_str, "color": "#2E8B57", "allDay": True})
-        for _, atividade in df_atividades_recorrentes[df_atividades_recorrentes['dia_semana'] == dia_semana_en].iterrows():
-            calendar_events.append({"title": f"{atividade['tipo']}: {atividade['titulo']}", "start": f"{data_str}T{atividade['hora_inicio']}", "end": f"{data_str}T{atividade['hora_fim']}", "color": cores_eventos.get(atividade['tipo'], "#808080")})
-
-    calendar(events=calendar_events, options={"headerToolbar": {"left": "prev,next today", "center": "title", "right": "dayGridMonth,timeGridWeek,timeGridDay"}, "initialView": "timeGridWeek", "locale": "pt-br"})
+    # Navegação pelo Streamlit: o componente não avisa quando muda de semana, então ele é montado na data escolhida
+    referencia = st.session_state.setdefault("calendario_data", date.today())
+    col1, col2, col3, col4, col5 = st.columns([1, 1, 1, 2, 2])
+    visao = col5.radio("Visão", list(VISOES_CALENDARIO), horizontal=True, key="calendario_visao", label_visibility="collapsed")
+    if col1.button("◀ Anterior"):
+        referencia = navegar(referencia, visao, -1)
+    if col2.button("Hoje"):
+        referencia = date.today()
+    if col3.button("Próximo ▶"):
+        referencia = navegar(referencia, visao, 1)
+    escolhida = col4.date_input("Ir para", value=referencia, format="DD/MM/YYYY", key=f"calendario_ir_{referencia}", label_visibility="collapsed")
+    st.session_state["calendario_data"] = referencia = escolhida or referencia
+
+    inicio, fim = intervalo_expansao(intervalo_visivel(referencia, visao))
+    calendar_events = eventos_calendario(carregar_tabela(EVENTOS_CSV), carregar_tabela(AULAS_CSV), carregar_tabela(TAREFAS_CSV),
+                                         carregar_tabela(ATIVIDADES_RECORRENTES_CSV), inicio, fim)
+    with medir("calendário: componente") as registro:
+        registro["linhas"] = len(calendar_events)
+        calendar(events=calendar_events, options={"headerToolbar": {"left": "", "center": "title", "right": ""}, "initialView": VISOES_CALENDARIO[visao],
+                                                  "initialDate": referencia.isoformat(), "firstDay": 1, "locale": "pt-br"},
+                 key=f"calendario_{referencia}_{visao}")
 
 # ==========================================================
 # PÁGINA "CADASTROS" UNIFICADA
@@ -289,10 +504,11 @@ elif menu == "Cadastros":
     st.title("⚙️ Central de Cadastros")
     
     tipo_cadastro = st.selectbox("O que você deseja cadastrar ou gerenciar?", 
-                                 ["Aulas", "Compromissos", "Tarefas da Casa", "Checklist de Hábitos (sem horário)"])
+                                 ["Aulas", "Compromissos", "Tarefas da Casa", "Checklist de Hábitos (sem horário)", "Importar/Exportar Calendário (.ics)"])
 
     if tipo_cadastro == "Aulas":
         st.subheader("📚 Gerenciar Disciplinas e Aulas")
+        df_aulas = carregar_tabela(AULAS_CSV)
         with st.form("form_aulas", clear_on_submit=True):
             disciplina = st.text_input("Nome da Disciplina")
             sala = st.text_input("Sala (opcional)")
@@ -305,32 +521,31 @@ elif menu == "Cadastros":
                 hora_fim = col2.time_input("Hora de Término", key=f"fim_{dia_pt}")
                 horarios[dia_pt] = (hora_inicio, hora_fim)
             if st.form_submit_button("Salvar Disciplina e Horários"):
+                novas_aulas = []
                 for dia_pt, (inicio, fim) in horarios.items():
                     if inicio and fim:
                         dia_en = [k for k, v in DIAS_PT.items() if v == dia_pt][0]
-                        nova_aula = pd.DataFrame([[disciplina, sala, dia_en, inicio.strftime('%H:%M'), fim.strftime('%H:%M')]], columns=colunas_aulas)
-                        df_aulas = pd.concat([df_aulas, nova_aula], ignore_index=True)
-                df_aulas.to_csv(AULAS_CSV, index=False)
-                st.success(f"Disciplina '{disciplina}' salva com sucesso!")
+                        novas_aulas.append([disciplina, sala, dia_en, inicio.strftime('%H:%M'), fim.strftime('%H:%M')])
+                conflitos = [descrever_conflito(item, DIAS_PT[dia_en]) for _, _, dia_en, inicio, fim in novas_aulas
+                             for item in conflitos_horario(armazenamento, inicio, fim, dia_semana=dia_en)]
+                if salvar_ou_avisar("aulas", AULAS_CSV, pd.DataFrame(novas_aulas, columns=colunas_aulas), conflitos, f"Disciplina '{disciplina}' salva com sucesso!"):
+                    df_aulas = carregar_tabela(AULAS_CSV)
+                    st.success(f"Disciplina '{disciplina}' salva com sucesso!")
+        confirmar_conflitos("aulas", AULAS_CSV)
 
         st.markdown("### Aulas Cadastradas")
-        for index, row in df_aulas.iterrows():
-            col1, col2 = st.columns([0.9, 0.1])
-            dia_pt = DIAS_PT.get(row['dia_semana'], '')
-            col1.write(f"**{row['disciplina']}** - {dia_pt} ({row['hora_inicio']} - {row['hora_fim']}) Sala: {row['sala']}")
-            if col2.button("Excluir", key=f"del_aula_{index}"):
-                df_aulas.drop(index, inplace=True)
-                df_aulas.to_csv(AULAS_CSV, index=False)
-                st.rerun()
+        grade_cadastros(df_aulas, AULAS_CSV, "aulas", ["disciplina", "sala", "dia_semana", "hora_inicio", "hora_fim"],
+                        {"disciplina": "Disciplina", "sala": "Sala", "dia_semana": "Dia", "hora_inicio": "Início", "hora_fim": "Término"})
 
     elif tipo_cadastro == "Compromissos":
         st.subheader("🗓️ Agendar Compromissos")
         recorrente = st.checkbox("É um compromisso recorrente? (Ex: estudar, se exercitar)")
         if recorrente:
             st.markdown("#### Cadastrar Compromisso Recorrente")
+            df_atividades_recorrentes = carregar_tabela(ATIVIDADES_RECORRENTES_CSV)
             with st.form("form_recorrente", clear_on_submit=True):
                 titulo = st.text_input("Título do Compromisso (Ex: Academia, Estudar Python)")
-                tipo = st.selectbox("Tipo de Compromisso", ["Estudo", "Exercício", "Lembrete", "Outro"])
+                tipo = st.selectbox("Tipo de Compromisso", TIPOS_RECORRENTES)
                 dias_recorrentes = st.multiselect("Selecione os dias em que se repete:", options=list(DIAS_PT.values()))
                 horarios_recorrentes = {}
                 for dia_pt in dias_recorrentes:
@@ -341,27 +556,27 @@ elif menu == "Cadastros":
                     horarios_recorrentes[dia_pt] = (hora_inicio_rec, hora_fim_rec)
                 
                 if st.form_submit_button("Salvar Compromisso Recorrente"):
+                    novas_ativs = []
                     for dia_pt, (inicio, fim) in horarios_recorrentes.items():
                         if inicio:
                             dia_en = [k for k, v in DIAS_PT.items() if v == dia_pt][0]
-                            nova_ativ = pd.DataFrame([[titulo, tipo, dia_en, inicio.strftime('%H:%M'), fim.strftime('%H:%M') if fim else '']], columns=colunas_atividades_recorrentes)
-                            df_atividades_recorrentes = pd.concat([df_atividades_recorrentes, nova_ativ], ignore_index=True)
-                    df_atividades_recorrentes.to_csv(ATIVIDADES_RECORRENTES_CSV, index=False)
-                    st.success("Compromisso recorrente salvo!")
+                            novas_ativs.append([titulo, tipo, dia_en, inicio.strftime('%H:%M'), fim.strftime('%H:%M') if fim else ''])
+                    conflitos = [descrever_conflito(item, DIAS_PT[dia_en]) for _, _, dia_en, inicio, fim in novas_ativs
+                                 for item in conflitos_horario(armazenamento, inicio, fim, dia_semana=dia_en)]
+                    if salvar_ou_avisar("recorrentes", ATIVIDADES_RECORRENTES_CSV, pd.DataFrame(novas_ativs, columns=colunas_atividades_recorrentes),
+                                        conflitos, "Compromisso recorrente salvo!"):
+                        df_atividades_recorrentes = carregar_tabela(ATIVIDADES_RECORRENTES_CSV)
+                        st.success("Compromisso recorrente salvo!")
+            confirmar_conflitos("recorrentes", ATIVIDADES_RECORRENTES_CSV)
             st.markdown("#### Compromissos Recorrentes Cadastrados")
-            for index, row in df_atividades_recorrentes.iterrows():
-                col1, col2 = st.columns([0.9, 0.1])
-                dia_pt = DIAS_PT.get(row['dia_semana'], '')
-                col1.write(f"**{row['titulo']}** ({row['tipo']}) - {dia_pt} ({row['hora_inicio']})")
-                if col2.button("Excluir", key=f"del_ativ_rec_{index}"):
-                    df_atividades_recorrentes.drop(index, inplace=True)
-                    df_atividades_recorrentes.to_csv(ATIVIDADES_RECORRENTES_CSV, index=False)
-                    st.rerun()
+            grade_cadastros(df_atividades_recorrentes, ATIVIDADES_RECORRENTES_CSV, "recorrentes", ["titulo", "tipo", "dia_semana", "hora_inicio", "hora_fim"],
+                            {"titulo": "Título", "tipo": "Tipo", "dia_semana": "Dia", "hora_inicio": "Início", "hora_fim": "Término"}, opcoes={"tipo": TIPOS_RECORRENTES})
         else:
             st.markdown("#### Cadastrar Compromisso Único")
+            df_eventos = carregar_tabela(EVENTOS_CSV)
             with st.form("form_eventos", clear_on_submit=True):
                 data = st.date_input("Data do Compromisso")
-                tipo = st.selectbox("Tipo de Compromisso", ["Prova", "Trabalho", "Consulta", "Lembrete"])
+                tipo = st.selectbox("Tipo de Compromisso", TIPOS_EVENTOS)
                 titulo = st.text_input("Título (Ex: Prova de Cálculo, Dentista)")
                 col1, col2 = st.columns(2)
                 hora_inicio = col1.time_input("Hora de Início (opcional)", value=None)
@@ -371,88 +586,149 @@ elif menu == "Cadastros":
                     hora_inicio_str = hora_inicio.strftime('%H:%M') if hora_inicio else ''
                     hora_fim_str = hora_fim.strftime('%H:%M') if hora_fim else ''
                     nova = pd.DataFrame([[data.strftime("%Y-%m-%d"), tipo, titulo, descricao, hora_inicio_str, hora_fim_str]], columns=colunas_eventos)
-                    df_eventos = pd.concat([df_eventos, nova], ignore_index=True)
-                    df_eventos.to_csv(EVENTOS_CSV, index=False)
-                    st.toast("Compromisso salvo!", icon="✅")
+                    conflitos = []
+                    if hora_inicio_str:
+                        conflitos = [descrever_conflito(item, data.strftime("%d/%m/%Y"))
+                                     for item in conflitos_horario(armazenamento, hora_inicio_str, hora_fim_str, data=data.strftime("%Y-%m-%d"))]
+                    if salvar_ou_avisar("eventos", EVENTOS_CSV, nova, conflitos, "Compromisso salvo!"):
+                        df_eventos = carregar_tabela(EVENTOS_CSV)
+                        st.toast("Compromisso salvo!", icon="✅")
+            confirmar_conflitos("eventos", EVENTOS_CSV)
             st.markdown("#### Compromissos Únicos Cadastrados")
-            for index, row in df_eventos.iterrows():
-                col1, col2 = st.columns([0.9, 0.1])
-                col1.write(f"**{row['data']}** - {row['titulo']} ({row['tipo']})")
-                if col2.button("Excluir", key=f"del_evento_{index}"):
-                    df_eventos.drop(index, inplace=True)
-                    df_eventos.to_csv(EVENTOS_CSV, index=False)
-                    st.rerun()
+            grade_cadastros(df_eventos.sort_values("data", kind="stable"), EVENTOS_CSV, "eventos", ["data", "tipo", "titulo", "hora_inicio", "hora_fim", "descricao"],
+                            {"data": "Data", "tipo": "Tipo", "titulo": "Título", "hora_inicio": "Início", "hora_fim": "Término", "descricao": "Descrição"},
+                            opcoes={"tipo": TIPOS_EVENTOS}, filtrar_periodo=True)
 
     elif tipo_cadastro == "Tarefas da Casa":
         st.subheader("🏠 Organizar Tarefas da Semana")
+        df_tarefas = carregar_tabela(TAREFAS_CSV)
         with st.form("form_tarefas", clear_on_submit=True):
             dia_pt = st.selectbox("Selecione o dia da semana", options=list(DIAS_PT.values()))
             dia_en = [k for k, v in DIAS_PT.items() if v == dia_pt][0]
             tarefa = st.text_input("Qual tarefa você quer agendar?", placeholder="Ex: Lavar roupa, Fazer feira")
             if st.form_submit_button("Agendar Tarefa"):
                 if tarefa:
-                    nova_tarefa = pd.DataFrame([[dia_en, tarefa]], columns=["dia_semana", "tarefa"])
-                    df_tarefas = pd.concat([df_tarefas, nova_tarefa], ignore_index=True)
-                    df_tarefas.to_csv(TAREFAS_CSV, index=False)
+                    nova_tarefa = pd.DataFrame([[dia_en, tarefa]], columns=colunas_tarefas)
+                    armazenamento.inserir(TAREFAS_CSV, nova_tarefa)
+                    df_tarefas = carregar_tabela(TAREFAS_CSV)
                     st.toast(f'Tarefa "{tarefa}" agendada para toda {dia_pt}!', icon="👍")
         st.markdown("### Seu Cronograma de Tarefas")
-        for index, row in df_tarefas.iterrows():
-            col1, col2 = st.columns([0.9, 0.1])
-            dia_pt = DIAS_PT.get(row['dia_semana'], '')
-            col1.write(f"**{dia_pt}**: {row['tarefa']}")
-            if col2.button("Excluir", key=f"del_tarefa_{index}"):
-                df_tarefas.drop(index, inplace=True)
-                df_tarefas.to_csv(TAREFAS_CSV, index=False)
-                st.rerun()
+        grade_cadastros(df_tarefas, TAREFAS_CSV, "tarefas", ["dia_semana", "tarefa"], {"dia_semana": "Dia", "tarefa": "Tarefa"})
 
     elif tipo_cadastro == "Checklist de Hábitos (sem horário)":
         st.subheader("🎨 Personalizar Hábitos do Checklist")
+        df_meus_habitos = carregar_tabela(MEUS_HABITOS_CSV)
         st.write("Adicione ou remova os hábitos que você deseja marcar como 'feitos' no seu dia a dia (sem horário fixo).")
         with st.form("form_novo_habito", clear_on_submit=True):
             novo_habito_txt = st.text_input("Digite um novo hábito (Ex: Cuidar da pele, Ler 10 páginas)")
             if st.form_submit_button("Adicionar Hábito"):
                 if novo_habito_txt and novo_habito_txt not in df_meus_habitos["habito"].values:
                     novo_df = pd.DataFrame([[novo_habito_txt]], columns=["habito"])
-                    df_meus_habitos = pd.concat([df_meus_habitos, novo_df], ignore_index=True)
-                    df_meus_habitos.to_csv(MEUS_HABITOS_CSV, index=False)
+                    armazenamento.inserir(MEUS_HABITOS_CSV, novo_df)
+                    df_meus_habitos = carregar_tabela(MEUS_HABITOS_CSV)
                     st.toast(f'Hábito "{novo_habito_txt}" adicionado!', icon="✨")
                 else:
                     st.warning("Hábito já existe ou campo está vazio.")
         st.markdown("### Seus Hábitos Atuais")
         if not df_meus_habitos.empty:
-            for index, row in df_meus_habitos.iterrows():
-                col1, col2 = st.columns([0.8, 0.2])
-                col1.write(f"- {row['habito']}")
-                if col2.button("Excluir", key=f"del_{index}"):
-                    df_meus_habitos.drop(index, inplace=True)
-                    df_meus_habitos.to_csv(MEUS_HABITOS_CSV, index=False)
-                    st.rerun()
+            grade_cadastros(df_meus_habitos, MEUS_HABITOS_CSV, "habitos", ["habito"], {"habito": "Hábito"})
         else:
             st.info("Você ainda não adicionou nenhum hábito personalizado.")
 
+    elif tipo_cadastro == "Importar/Exportar Calendário (.ics)":
+        st.subheader("🔄 Importar e Exportar Calendário")
+        st.write("Traga compromissos de outro calendário (Google, Outlook, sistema da faculdade) ou leve os seus para lá.")
+        with st.form("form_importar_ics", clear_on_submit=True):
+            arquivo_ics = st.file_uploader("Arquivo .ics", type=["ics"])
+            semanais = st.radio("Compromissos semanais sem a categoria \"Aula\" entram como:", ["Compromissos recorrentes", "Aulas"], horizontal=True)
+            if st.form_submit_button("Importar") and arquivo_ics is not None:
+                barra = st.progress(0.0, text="Lendo o arquivo...")
+                resultado = importar_ics(armazenamento, arquivo_ics, tamanho=arquivo_ics.size,
+                                         semanais_como=AULAS_CSV if semanais == "Aulas" else ATIVIDADES_RECORRENTES_CSV,
+                                         progresso=lambda fracao, lidos: barra.progress(fracao or 0.0, text=f"{lidos} eventos lidos..."))
+                barra.empty()
+                st.success(f"{resultado[EVENTOS_CSV]} compromisso(s), {resultado[AULAS_CSV]} aula(s) e "
+                           f"{resultado[ATIVIDADES_RECORRENTES_CSV]} compromisso(s) recorrente(s) importados de {resultado['lidos']} evento(s).")
+                if resultado["repetidos"] or resultado["ignorados"]:
+                    st.info(f"{resultado['repetidos']} já estavam cadastrados; {resultado['ignorados']} não puderam ser importados "
+                            "(repetição não semanal, já encerrada, cancelada ou sem data).")
+
+        st.markdown("#### Exportar")
+        if st.button("Gerar arquivo .ics"):
+            # O arquivo é escrito aos poucos no disco; só o resultado final vai para o botão de download
+            with medir("ics: exportar"), tempfile.TemporaryFile("w+b") as saida:
+                for linha in exportar_ics(armazenamento):
+                    saida.write(linha.encode("utf-8"))
+                saida.seek(0)
+                st.download_button("Baixar minha_rotina.ics", saida.read(), file_name="minha_rotina.ics", mime="text/calendar")
+
 # ==========================================================
 # PÁGINA "LISTA DE COMPRAS"
 # ==========================================================
 elif menu == "Lista de Compras":
     st.title("🛒 Lista de Compras")
-    with st.form("form_compras", clear_on_submit=True):
-        item = st.text_input("Adicionar item à lista")
-        if st.form_submit_button("Adicionar"):
-            if item:
-                novo_item = pd.DataFrame([[item, False]], columns=["item", "comprado"])
-                df_compras = pd.concat([df_compras, novo_item], ignore_index=True)
-                df_compras.to_csv(COMPRAS_CSV, index=False)
-                st.toast(f'"{item}" adicionado à lista!', icon="➕")
-    st.markdown("### Itens para comprar:")
-    for index, row in df_compras.iterrows():
-        # A conversão para bool é importante aqui
-        comprado = st.checkbox(row["item"], value=bool(eval(str(row["comprado"]))), key=f"item_{index}")
-        if comprado != bool(eval(str(row["comprado"]))):
-            df_compras.at[index, "comprado"] = comprado
-            df_compras.to_csv(COMPRAS_CSV, index=False)
-            st.rerun()
-    if not df_compras.empty and st.button("Limpar itens comprados"):
-        df_compras = df_compras[df_compras["comprado"] == False]
-        df_compras.to_csv(COMPRAS_CSV, index=False)
-        st.toast("Lista limpa!", icon="🗑️")
+    lista_de_compras()
+
+# ==========================================================
+# PÁGINA "ESTATÍSTICAS"
+# ==========================================================
+elif menu == "Estatísticas":
+    st.title("📊 Estatísticas dos Hábitos")
+    estatisticas_prontas(armazenamento)
+    habitos = list(ROTINA.values()) + [HABITO_AGUA] + carregar_tabela(MEUS_HABITOS_CSV)["habito"].tolist()
+    df_resumo = resumo(armazenamento, habitos, datetime.now())
+
+    agua_resumo = df_resumo[df_resumo["habito"] == HABITO_AGUA].iloc[0]
+    col1, col2, col3 = st.columns(3)
+    col1.metric(f"💧 Meta de {META_AGUA} ml (semana)", "—" if pd.isna(agua_resumo["taxa_semana"]) else f"{agua_resumo['taxa_semana']:.0%}")
+    col2.metric(f"💧 Meta de {META_AGUA} ml (mês)", "—" if pd.isna(agua_resumo["taxa_mes"]) else f"{agua_resumo['taxa_mes']:.0%}")
+    col3.metric("🔥 Maior sequência atual", f"{df_resumo['sequencia_atual'].max()} dia(s)")
+
+    st.dataframe(df_resumo.assign(taxa_semana=df_resumo["taxa_semana"] * 100, taxa_mes=df_resumo["taxa_mes"] * 100), hide_index=True, column_config={
+        "habito": st.column_config.TextColumn("Hábito"),
+        "sequencia_atual": st.column_config.NumberColumn("Sequência atual", format="%d 🔥"),
+        "maior_sequencia": st.column_config.NumberColumn("Maior sequência", format="%d"),
+        "taxa_semana": st.column_config.ProgressColumn("Nesta semana", min_value=0, max_value=100, format="%.0f%%"),
+        "taxa_mes": st.column_config.ProgressColumn("Neste mês", min_value=0, max_value=100, format="%.0f%%"),
+    })
+
+    st.subheader("Conclusão por mês")
+    mensal = historico_mensal(armazenamento, habitos)
+    if mensal.empty:
+        st.info("Salve seu autocuidado no Hoje para começar a acompanhar seus hábitos.")
+    else:
+        st.line_chart(mensal)
+    if st.button("Recalcular a partir do histórico"):
+        reconstruir(armazenamento)
         st.rerun()
+
+# ==========================================================
+# PÁGINA "BUSCA"
+# ==========================================================
+elif menu == "Busca":
+    st.title("🔎 Buscar nas Reflexões e Compromissos")
+    indice_busca.sincronizar(armazenamento)
+    consulta = st.text_input("O que você procura?", placeholder="Ex: prova, família, caminhada")
+    col1, col2 = st.columns(2)
+    periodo = col1.date_input("Período", value=(), format="DD/MM/YYYY")
+    origens = {"Reflexões": DIARIO_CSV, "Compromissos": EVENTOS_CSV}
+    escolhidas = col2.multiselect("Buscar em", list(origens), default=list(origens))
+    if consulta:
+        inicio, fim = periodo if len(periodo) == 2 else (None, None)
+        resultados = indice_busca.buscar(consulta, inicio, fim, [origens[origem] for origem in escolhidas])
+        if resultados.empty:
+            st.info("Nada encontrado.")
+        else:
+            st.caption(f"{len(resultados)} resultado(s), do mais ao menos relevante")
+        for resultado in resultados.itertuples():
+            data_exibicao = pd.Timestamp(resultado.data).strftime("%d/%m/%Y")
+            if resultado.origem == DIARIO_CSV:
+                cabecalho = f"✨ **{data_exibicao}** · {resultado.rotulo}"
+            else:
+                horario = f" às {resultado.hora}" if resultado.hora else ""
+                cabecalho = f"{ICON_MAP.get(resultado.rotulo, '📌')} **{data_exibicao}{horario}** · {resultado.titulo}"
+            with st.container(border=True):
+                st.markdown(cabecalho)
+                st.markdown(resultado.trecho.replace("\n", " "))
+
+finalizar_rerun(menu)
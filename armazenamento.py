@@ -0,0 +1,775 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+from datetime import date
+from functools import wraps
+from importlib.util import find_spec
+import pandas as pd
+import streamlit as st
+from perfil import medir
+
+# --- Configuração do Armazenamento ---
+# "csv" mantém os arquivos de sempre; "sqlite" usa um banco único com índices
+BACKEND = os.environ.get("ROTINA_ARMAZENAMENTO", "csv")
+BANCO_SQLITE = "rotina.sqlite"
+COLUNAS_INDEXADAS = ["data", "dia_semana"]
+DIRETORIO_HISTORICO = "historico"
+PARQUET_DISPONIVEL = find_spec("pyarrow") is not None # Sem pyarrow, os meses fechados continuam em CSV
+REGISTRO_PENDENTE = ".rotina-pendente.json" # Lote de arquivos confirmado, mas ainda não renomeado
+TRAVA_ESCRITA = ".rotina.lock"
+LIMITE_CACHE = int(os.environ.get("ROTINA_CACHE_MB", "256")) * 2**20 # Tabelas lidas mantidas em memória, somando todos os usuários
+TRAVA_ENTRE_PROCESSOS = find_spec("fcntl") is not None # No Windows, as escritas só são serializadas dentro do processo
+if TRAVA_ENTRE_PROCESSOS:
+    import fcntl
+
+# Modo multiusuário: cada usuário tem um diretório de dados próprio dentro de DIRETORIO_USUARIOS
+MULTIUSUARIO = os.environ.get("ROTINA_MULTIUSUARIO") == "1"
+DIRETORIO_USUARIOS = os.environ.get("ROTINA_DIRETORIO_USUARIOS", "usuarios")
+
+# --- Arquivos de Dados ---
+AULAS_CSV = "aulas.csv"
+EVENTOS_CSV = "eventos.csv"
+ATIVIDADES_RECORRENTES_CSV = "atividades_recorrentes.csv"
+TAREFAS_CSV = "tarefas_semanais.csv"
+COMPRAS_CSV = "lista_compras.csv"
+ROTINA_MATINAL_CSV = "rotina_matinal.csv"
+HABITOS_CSV = "habitos.csv"
+MEUS_HABITOS_CSV = "meus_habitos.csv"
+HABITOS_FEITOS_CSV = "habitos_feitos.csv"
+DIARIO_CSV = "diario.csv"
+SEQUENCIAS_CSV = "estatisticas_sequencias.csv" # Agregados mantidos por estatisticas.py
+PERIODOS_CSV = "estatisticas_periodos.csv"
+TABELAS = [AULAS_CSV, EVENTOS_CSV, ATIVIDADES_RECORRENTES_CSV, TAREFAS_CSV, COMPRAS_CSV, ROTINA_MATINAL_CSV, HABITOS_CSV, MEUS_HABITOS_CSV, HABITOS_FEITOS_CSV, DIARIO_CSV,
+           SEQUENCIAS_CSV, PERIODOS_CSV]
+TABELAS_HISTORICO = [ROTINA_MATINAL_CSV, HABITOS_CSV, HABITOS_FEITOS_CSV, DIARIO_CSV] # Crescem uma ou mais linhas por dia
+
+# --- Colunas das Tabelas ---
+colunas_aulas = ["disciplina", "sala", "dia_semana", "hora_inicio", "hora_fim"]
+colunas_eventos = ["data", "tipo", "titulo", "descricao", "hora_inicio", "hora_fim"]
+colunas_atividades_recorrentes = ["titulo", "tipo", "dia_semana", "hora_inicio", "hora_fim"]
+colunas_tarefas = ["dia_semana", "tarefa"]
+colunas_compras = ["item", "comprado"]
+colunas_rotina_matinal = ["data", "cama_arrumada", "dentes_escovados", "rosto_lavado", "meditacao"]
+colunas_habitos = ["data", "agua"]
+colunas_meus_habitos = ["habito"]
+colunas_habitos_feitos = ["data", "habito", "feito"]
+colunas_diario = ["data", "gratidao", "desafio", "aprendizado", "observacao"]
+colunas_sequencias = ["habito", "sequencia_atual", "ultimo_dia", "maior_anterior"]
+colunas_periodos = ["periodo", "habito", "feitos", "registrados"]
+
+# --- Esquema das Tabelas ---
+# Colunas não listadas continuam como texto
+ESQUEMAS = {
+    AULAS_CSV: {"dia_semana": "categoria", "hora_inicio": "hora", "hora_fim": "hora"},
+    EVENTOS_CSV: {"data": "data", "tipo": "categoria", "hora_inicio": "hora", "hora_fim": "hora"},
+    ATIVIDADES_RECORRENTES_CSV: {"tipo": "categoria", "dia_semana": "categoria", "hora_inicio": "hora", "hora_fim": "hora"},
+    TAREFAS_CSV: {"dia_semana": "categoria"},
+    COMPRAS_CSV: {"comprado": "bool"},
+    ROTINA_MATINAL_CSV: {"data": "data", "cama_arrumada": "bool", "dentes_escovados": "bool", "rosto_lavado": "bool", "meditacao": "bool"},
+    HABITOS_CSV: {"data": "data", "agua": "int"},
+    MEUS_HABITOS_CSV: {},
+    HABITOS_FEITOS_CSV: {"data": "data", "feito": "bool"},
+    DIARIO_CSV: {"data": "data"},
+    SEQUENCIAS_CSV: {"sequencia_atual": "int", "ultimo_dia": "data", "maior_anterior": "int"},
+    PERIODOS_CSV: {"feitos": "int", "registrados": "int"},
+}
+COLUNAS = {AULAS_CSV: colunas_aulas, EVENTOS_CSV: colunas_eventos, ATIVIDADES_RECORRENTES_CSV: colunas_atividades_recorrentes,
+           TAREFAS_CSV: colunas_tarefas, COMPRAS_CSV: colunas_compras, ROTINA_MATINAL_CSV: colunas_rotina_matinal, HABITOS_CSV: colunas_habitos,
+           MEUS_HABITOS_CSV: colunas_meus_habitos, HABITOS_FEITOS_CSV: colunas_habitos_feitos, DIARIO_CSV: colunas_diario,
+           SEQUENCIAS_CSV: colunas_sequencias, PERIODOS_CSV: colunas_periodos}
+
+
+# --- Funções Auxiliares ---
+def _tamanho(valor):
+    if isinstance(valor, pd.DataFrame):
+        return int(valor.memory_usage(deep=True).sum())
+    if isinstance(valor, dict):
+        return sum(_tamanho(item) for item in valor.values())
+    if isinstance(valor, tuple):
+        return sum(_tamanho(item) for item in valor)
+    return 0
+
+class CacheTabelas:
+    # LRU limitado pelos bytes dos DataFrames: sem limite, cada partição lida (reconstrução das estatísticas,
+    # índice de busca, exportação) ficaria na memória até o fim do processo, para todos os usuários
+    def __init__(self, limite):
+        self.limite = limite
+        self._entradas = OrderedDict() # chave -> (valor, bytes)
+        self._bytes = 0
+        self._trava = threading.Lock()
+
+    def get(self, chave):
+        with self._trava:
+            entrada = self._entradas.get(chave)
+            if entrada is None:
+                return None
+            self._entradas.move_to_end(chave)
+            return entrada[0]
+
+    def __setitem__(self, chave, valor):
+        tamanho = _tamanho(valor)
+        with self._trava:
+            self._remover(chave)
+            self._entradas[chave] = (valor, tamanho)
+            self._bytes += tamanho
+            while self._bytes > self.limite and len(self._entradas) > 1: # A entrada recém-lida sempre fica
+                _, (_, descartado) = self._entradas.popitem(last=False)
+                self._bytes -= descartado
+
+    def _remover(self, chave):
+        entrada = self._entradas.pop(chave, None)
+        if entrada is not None:
+            self._bytes -= entrada[1]
+        return entrada
+
+    def pop(self, chave, padrao=None):
+        with self._trava:
+            entrada = self._remover(chave)
+        return padrao if entrada is None else entrada[0]
+
+@st.cache_resource
+def _cache_tabelas():
+    # Cache compartilhado pelo processo: chave -> (assinatura, DataFrame)
+    return CacheTabelas(LIMITE_CACHE)
+
+@st.cache_resource
+def _travas_escrita():
+    # Uma trava por diretório de dados, compartilhada por todas as sessões do processo
+    return {}
+
+class TravaEscrita:
+    # RLock entre threads (sessões) e flock entre processos; o flock só é pego na chamada mais externa
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self._trava = threading.RLock()
+        self._profundidade = 0
+        self._arquivo = None
+
+    def __enter__(self):
+        self._trava.acquire()
+        self._profundidade += 1
+        if self._profundidade == 1 and TRAVA_ENTRE_PROCESSOS:
+            self._arquivo = open(self.caminho, "a")
+            fcntl.flock(self._arquivo, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *erro):
+        self._profundidade -= 1
+        if self._profundidade == 0 and self._arquivo is not None:
+            fcntl.flock(self._arquivo, fcntl.LOCK_UN)
+            self._arquivo.close()
+            self._arquivo = None
+        self._trava.release()
+
+def _escrita(metodo):
+    # Leitura, alteração e gravação acontecem com a trava do diretório, então nenhuma escrita concorrente se perde
+    @wraps(metodo)
+    def travado(self, *args, **kwargs):
+        with self._trava_escrita:
+            return metodo(self, *args, **kwargs)
+    return travado
+
+def diretorio_usuario(usuario):
+    # O nome vira um identificador seguro para o sistema de arquivos ("João Silva" -> "joao-silva")
+    nome = unicodedata.normalize("NFKD", usuario).encode("ascii", "ignore").decode().strip().lower()
+    nome = re.sub(r"[^a-z0-9_-]+", "-", nome).strip("-")
+    if not nome:
+        raise ValueError(f"Nome de usuário inválido: {usuario!r}")
+    return os.path.join(DIRETORIO_USUARIOS, nome)
+
+def _assinatura_arquivo(caminho):
+    info = os.stat(caminho)
+    return (info.st_mtime_ns, info.st_size)
+
+def _texto(valor):
+    if valor is None or (isinstance(valor, float) and pd.isna(valor)):
+        return ''
+    return str(valor)
+
+def nome_tabela(tabela):
+    return os.path.splitext(os.path.basename(tabela))[0]
+
+def _completar_colunas(df, colunas):
+    df = df.copy() # As páginas alteram os DataFrames, o cache não pode ser modificado
+    for col in colunas:
+        if col not in df.columns:
+            df[col] = ''
+    return df
+
+
+# --- Conversão de Tipos (uma operação vetorizada por coluna) ---
+def _para_bool(serie):
+    if pd.api.types.is_bool_dtype(serie):
+        return serie
+    return serie.astype(str).str.strip().str.lower().isin(["true", "1"])
+
+def _para_data(serie):
+    if pd.api.types.is_datetime64_dtype(serie):
+        return serie
+    return pd.to_datetime(serie.astype(str).str.slice(0, 10), format="%Y-%m-%d", errors="coerce")
+
+def _para_hora(serie):
+    # Texto canônico "HH:MM", que também ordena corretamente como string
+    partes = serie.astype(str).str.extract(r"^\s*(\d{1,2}):(\d{2})")
+    return (partes[0].str.zfill(2) + ":" + partes[1]).fillna('')
+
+def _para_int(serie):
+    if pd.api.types.is_integer_dtype(serie):
+        return serie
+    return pd.to_numeric(serie, errors="coerce").fillna(0).astype("int64")
+
+def _para_categoria(serie):
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        return serie
+    return serie.astype(str).str.strip().astype("category")
+
+CONVERSORES = {"bool": _para_bool, "data": _para_data, "hora": _para_hora, "int": _para_int, "categoria": _para_categoria}
+SERIALIZADORES = {
+    "bool": lambda serie: serie.map({True: "True", False: "False"}),
+    "data": lambda serie: serie.dt.strftime("%Y-%m-%d").fillna(''),
+    "hora": lambda serie: serie,
+    "int": lambda serie: serie.astype(str),
+    "categoria": lambda serie: serie.astype(str),
+}
+
+def converter(df, tabela):
+    df = _completar_colunas(df, COLUNAS.get(tabela, []))
+    for col, tipo in ESQUEMAS.get(tabela, {}).items():
+        df[col] = CONVERSORES[tipo](df[col])
+    return df
+
+def serializar(df, tabela):
+    # Valores canônicos em texto, do jeito que ficam gravados no disco
+    df = df.copy()
+    for col, tipo in ESQUEMAS.get(tabela, {}).items():
+        if col in df.columns:
+            df[col] = SERIALIZADORES[tipo](CONVERSORES[tipo](df[col]))
+    return df
+
+
+# --- Edição em Lote: cada linha é reconhecida pelos valores lidos, não pela posição ---
+class EdicaoConflitante(ValueError):
+    def __init__(self, indices):
+        super().__init__(f"{len(indices)} linha(s) mudaram ou foram removidas desde a leitura; nada foi gravado")
+        self.indices = list(indices)
+
+def _valores_linhas(df, tabela, colunas):
+    texto = serializar(df[colunas], tabela).fillna('').astype(str)
+    return pd.Series(list(texto.itertuples(index=False, name=None)), index=df.index, dtype=object)
+
+def _localizar(atuais, originais, indices, tabela):
+    # Índice lido -> índice atual. Sem originais, o índice só precisa existir. Com originais (as linhas como
+    # foram lidas), a linha tem de continuar igual: no mesmo índice ou, se outra gravação a deslocou, pelo conteúdo.
+    # Linhas que mudaram ou sumiram viram EdicaoConflitante.
+    indices = list(dict.fromkeys(indices))
+    if originais is None:
+        faltando = [indice for indice in indices if indice not in atuais.index]
+        if faltando:
+            raise EdicaoConflitante(faltando)
+        return {indice: indice for indice in indices}
+    colunas = list(originais.columns)
+    agora = _valores_linhas(atuais, tabela, colunas)
+    lidos = _valores_linhas(originais, tabela, colunas)
+    posicoes = {indice: indice for indice in indices
+                if indice in lidos.index and indice in agora.index and agora[indice] == lidos[indice]}
+    livres = {}
+    for indice, valores in agora.drop(index=list(posicoes)).items():
+        livres.setdefault(valores, []).append(indice)
+    faltando = []
+    for indice in indices:
+        if indice in posicoes:
+            continue
+        candidatos = livres.get(lidos[indice]) if indice in lidos.index else None
+        if candidatos:
+            posicoes[indice] = candidatos.pop(0)
+        else:
+            faltando.append(indice)
+    if faltando:
+        raise EdicaoConflitante(faltando)
+    return posicoes
+
+
+# ==========================================================
+# BACKEND CSV (um arquivo por tabela, reescrito a cada alteração)
+# ==========================================================
+# As tabelas de histórico ficam em partições mensais: meses fechados num arquivo
+# Parquet e o mês atual num CSV pequeno (historico/<tabela>/AAAA-MM.<ext>)
+def _mes(data):
+    return pd.Timestamp(data).strftime("%Y-%m")
+
+def _concatenar(partes):
+    # Ignora partes vazias para não perder os tipos das colunas no concat
+    cheias = [parte for parte in partes if not parte.empty]
+    return pd.concat(cheias, ignore_index=True) if cheias else partes[-1].reset_index(drop=True)
+
+def _data_texto(data):
+    return pd.Timestamp(data).strftime("%Y-%m-%d")
+
+def _filtrar_periodo(df, inicio, fim):
+    if inicio is not None:
+        df = df[df["data"] >= pd.Timestamp(inicio)]
+    if fim is not None:
+        df = df[df["data"] <= pd.Timestamp(fim)]
+    return df
+
+class ArmazenamentoCSV:
+    def __init__(self, diretorio="."):
+        self.diretorio = diretorio
+        self.identificador = ("csv", os.path.abspath(diretorio))
+        self._trava_escrita = _travas_escrita().setdefault(self.identificador, TravaEscrita(os.path.join(os.path.abspath(diretorio), TRAVA_ESCRITA)))
+
+    def _caminho(self, tabela):
+        return os.path.abspath(os.path.join(self.diretorio, tabela))
+
+    # --- Arquivos ---
+    def _ler_arquivo(self, caminho, tabela):
+        cache = _cache_tabelas()
+        assinatura = _assinatura_arquivo(caminho)
+        entrada = cache.get(caminho)
+        if entrada is None or entrada[0] != assinatura:
+            with medir(f"ler {os.path.relpath(caminho, self.diretorio)}") as registro:
+                if caminho.endswith(".parquet"):
+                    df_lido = converter(pd.read_parquet(caminho), tabela)
+                else:
+                    df_lido = converter(pd.read_csv(caminho, dtype=str).fillna(''), tabela) # Lê como texto e converte pelo esquema
+                registro.update(linhas=len(df_lido), bytes=assinatura[1])
+            cache[caminho] = (assinatura, df_lido)
+            return df_lido
+        return entrada[1]
+
+    def _escrever_temporario(self, caminho, tabela, df):
+        # O arquivo final só é substituído por rename, então uma queda no meio da escrita não o trunca
+        temporario = caminho + ".tmp"
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        with medir(f"gravar {os.path.relpath(caminho, self.diretorio)}") as registro:
+            if caminho.endswith(".parquet"):
+                with open(temporario, "wb") as arquivo:
+                    converter(df, tabela).reset_index(drop=True).to_parquet(arquivo, index=False)
+                    arquivo.flush()
+                    os.fsync(arquivo.fileno())
+            else:
+                with open(temporario, "w", newline="", encoding="utf-8") as arquivo:
+                    serializar(df, tabela).to_csv(arquivo, index=False)
+                    arquivo.flush()
+                    os.fsync(arquivo.fileno())
+            registro.update(linhas=len(df), bytes=os.path.getsize(temporario))
+        return temporario
+
+    def _gravar_arquivo(self, caminho, tabela, df):
+        os.replace(self._escrever_temporario(caminho, tabela, df), caminho)
+        _cache_tabelas().pop(caminho, None)
+
+    def _caminho_registro(self):
+        return os.path.join(os.path.abspath(self.diretorio), REGISTRO_PENDENTE)
+
+    def _confirmar(self, arquivos):
+        # Write-ahead: grava todos os temporários, registra o lote e só então renomeia.
+        # Se o processo cair depois do registro, aplicar_pendentes() conclui o lote na próxima inicialização
+        pendentes = [[self._escrever_temporario(caminho, tabela, df), caminho] for caminho, (tabela, df) in arquivos.items()]
+        registro = self._caminho_registro()
+        with open(registro + ".tmp", "w", encoding="utf-8") as arquivo:
+            json.dump(pendentes, arquivo)
+            arquivo.flush()
+            os.fsync(arquivo.fileno())
+        os.replace(registro + ".tmp", registro)
+        self.aplicar_pendentes()
+
+    @_escrita
+    def aplicar_pendentes(self):
+        registro = self._caminho_registro()
+        if not os.path.exists(registro):
+            return
+        with open(registro, encoding="utf-8") as arquivo:
+            pendentes = json.load(arquivo)
+        for temporario, caminho in pendentes:
+            if os.path.exists(temporario):
+                os.replace(temporario, caminho)
+            _cache_tabelas().pop(caminho, None)
+        os.remove(registro)
+
+    def _remover_arquivo(self, caminho):
+        os.remove(caminho)
+        _cache_tabelas().pop(caminho, None)
+
+    # --- Partições Mensais ---
+    def _pasta_particoes(self, tabela):
+        return os.path.join(os.path.abspath(self.diretorio), DIRETORIO_HISTORICO, nome_tabela(tabela))
+
+    def _particoes(self, tabela):
+        pasta = self._pasta_particoes(tabela)
+        if not os.path.isdir(pasta):
+            return {}
+        particoes = {}
+        for arquivo in sorted(os.listdir(pasta)):
+            mes, extensao = os.path.splitext(arquivo)
+            if extensao == ".parquet" or (extensao == ".csv" and mes not in particoes):
+                particoes[mes] = os.path.join(pasta, arquivo)
+        return particoes
+
+    def _caminho_particao(self, tabela, mes):
+        existente = self._particoes(tabela).get(mes)
+        if existente:
+            return existente
+        extensao = ".parquet" if PARQUET_DISPONIVEL and mes < _mes(date.today()) else ".csv"
+        return os.path.join(self._pasta_particoes(tabela), mes + extensao)
+
+    def _por_arquivo(self, tabela, linhas):
+        if tabela not in TABELAS_HISTORICO:
+            return [(self._caminho(tabela), linhas)]
+        meses = linhas["data"].dt.strftime("%Y-%m").fillna("0000-00")
+        return [(self._caminho_particao(tabela, mes), grupo) for mes, grupo in linhas.groupby(meses)]
+
+    @_escrita
+    def migrar_particoes(self):
+        # Divide os CSVs antigos de histórico em partições mensais uma única vez
+        for tabela in TABELAS_HISTORICO:
+            legado = self._caminho(tabela)
+            if os.path.exists(legado) and not self._particoes(tabela):
+                self.salvar(tabela, self._ler_arquivo(legado, tabela))
+                os.replace(legado, legado + ".bak")
+                _cache_tabelas().pop(legado, None)
+
+    @_escrita
+    def compactar(self):
+        # Leva para o arquivo Parquet os meses que já fecharam
+        if not PARQUET_DISPONIVEL:
+            return
+        mes_atual = _mes(date.today())
+        for tabela in TABELAS_HISTORICO:
+            for mes, caminho in self._particoes(tabela).items():
+                if caminho.endswith(".csv") and mes < mes_atual:
+                    self._gravar_arquivo(caminho[:-len(".csv")] + ".parquet", tabela, self._ler_arquivo(caminho, tabela))
+                    self._remover_arquivo(caminho)
+
+    # --- Interface do Armazenamento ---
+    def assinatura(self, tabela):
+        if tabela in TABELAS_HISTORICO:
+            return tuple((mes, _assinatura_arquivo(caminho)) for mes, caminho in self._particoes(tabela).items())
+        caminho = self._caminho(tabela)
+        return _assinatura_arquivo(caminho) if os.path.exists(caminho) else None
+
+    def trava(self):
+        # Para quem lê, calcula e grava em seguida (ex.: agregados das estatísticas) sem outra escrita no meio
+        return self._trava_escrita
+
+    def existe(self, tabela):
+        # Se a tabela já foi gravada alguma vez, mesmo vazia
+        return os.path.exists(self._caminho(tabela)) or bool(self._particoes(tabela))
+
+    def invalidar(self, tabela):
+        _cache_tabelas().pop(self._caminho(tabela), None)
+        for caminho in self._particoes(tabela).values():
+            _cache_tabelas().pop(caminho, None)
+
+    def carregar(self, tabela, colunas, inicio=None, fim=None):
+        with medir(f"carregar {tabela}") as registro:
+            df = self._carregar(tabela, colunas, inicio, fim)
+            registro["linhas"] = len(df)
+        return df
+
+    def _carregar(self, tabela, colunas, inicio, fim):
+        # inicio/fim (inclusivos) limitam as linhas pela coluna "data" e, no histórico, as partições lidas
+        particoes = self._particoes(tabela) if tabela in TABELAS_HISTORICO else {}
+        if particoes or (tabela in TABELAS_HISTORICO and not os.path.exists(self._caminho(tabela))):
+            meses = [caminho for mes, caminho in particoes.items()
+                     if (inicio is None or mes >= _mes(inicio)) and (fim is None or mes <= _mes(fim))]
+            partes = [self._ler_arquivo(caminho, tabela) for caminho in meses]
+            df = pd.concat(partes, ignore_index=True) if partes else converter(pd.DataFrame(columns=colunas), tabela)
+        else:
+            caminho = self._caminho(tabela)
+            if not os.path.exists(caminho):
+                return converter(pd.DataFrame(columns=colunas), tabela)
+            df = self._ler_arquivo(caminho, tabela)
+        if inicio is not None or fim is not None:
+            df = _filtrar_periodo(df, inicio, fim)
+        return _completar_colunas(df, colunas)
+
+    @_escrita
+    def salvar(self, tabela, df):
+        df = converter(df, tabela)
+        antigos = set(self._particoes(tabela).values())
+        for caminho, linhas in self._por_arquivo(tabela, df):
+            self._gravar_arquivo(caminho, tabela, linhas)
+            antigos.discard(caminho)
+        for caminho in antigos:
+            self._remover_arquivo(caminho)
+
+    def _atual(self, caminho, tabela, colunas):
+        if not os.path.exists(caminho):
+            return converter(pd.DataFrame(columns=colunas), tabela)
+        return _completar_colunas(self._ler_arquivo(caminho, tabela), colunas).reset_index(drop=True)
+
+    @_escrita
+    def inserir(self, tabela, linhas):
+        if linhas.empty:
+            return
+        for caminho, novas in self._por_arquivo(tabela, converter(linhas, tabela)):
+            df = self._atual(caminho, tabela, list(linhas.columns))
+            self._gravar_arquivo(caminho, tabela, _concatenar([df, novas]))
+
+    @_escrita
+    def upsert(self, tabela, chave, linhas):
+        # Remove as linhas com a mesma chave e grava as novas, uma reescrita por arquivo afetado
+        for caminho, novas in self._por_arquivo(tabela, converter(linhas, tabela)):
+            df = self._atual(caminho, tabela, list(linhas.columns))
+            if not df.empty:
+                chaves_novas = serializar(novas[chave], tabela).apply(tuple, axis=1)
+                existentes = serializar(df[chave], tabela).apply(tuple, axis=1)
+                df = df[~existentes.isin(set(chaves_novas))]
+            self._gravar_arquivo(caminho, tabela, _concatenar([df, novas]))
+
+    @_escrita
+    def upsert_dia(self, data, tabelas):
+        # Substitui as linhas do dia em cada tabela ({tabela: linhas}) e confirma todos os arquivos juntos
+        dia = pd.Timestamp(data)
+        arquivos = {}
+        for tabela, linhas in tabelas.items():
+            linhas = converter(linhas, tabela).assign(data=dia)
+            caminho = self._caminho_particao(tabela, _mes(dia)) if tabela in TABELAS_HISTORICO else self._caminho(tabela)
+            df = self._atual(caminho, tabela, list(linhas.columns))
+            arquivos[caminho] = (tabela, _concatenar([df[df["data"] != dia], linhas]))
+        self._confirmar(arquivos)
+
+    def _tabela_simples(self, tabela):
+        if tabela in TABELAS_HISTORICO:
+            raise ValueError(f"A tabela {tabela} é particionada por mês; altere-a com upsert pela data")
+        return self._caminho(tabela)
+
+    @_escrita
+    def alterar_lote(self, tabela, atualizacoes=None, excluidos=(), novas=None, originais=None):
+        # Atualizações ({indice: {coluna: valor}}), exclusões e inclusões numa única reescrita.
+        # originais: as linhas editadas como foram lidas (mesmos índices), para achá-las mesmo se outra gravação as deslocou
+        caminho = self._tabela_simples(tabela)
+        atualizacoes = atualizacoes or {}
+        colunas = sorted({coluna for valores in atualizacoes.values() for coluna in valores} | set([] if originais is None else originais.columns))
+        df = serializar(self._atual(caminho, tabela, colunas), tabela)
+        posicoes = _localizar(df, originais, list(atualizacoes) + list(excluidos), tabela)
+        for indice, valores in atualizacoes.items():
+            novos = serializar(pd.DataFrame([valores]), tabela).iloc[0]
+            for coluna in valores:
+                df.at[posicoes[indice], coluna] = _texto(novos[coluna])
+        df = df.drop(index=list({posicoes[indice] for indice in excluidos}))
+        if novas is not None and not novas.empty:
+            df = _concatenar([df, serializar(converter(novas, tabela), tabela)])
+        self._gravar_arquivo(caminho, tabela, df)
+
+    def excluir(self, tabela, indices):
+        self.alterar_lote(tabela, excluidos=indices)
+
+    def atualizar(self, tabela, indice, valores):
+        self.alterar_lote(tabela, atualizacoes={indice: valores})
+
+
+# ==========================================================
+# BACKEND SQLITE (alterações por linha, em transação)
+# ==========================================================
+class ArmazenamentoSQLite:
+    def __init__(self, banco):
+        self.banco = os.path.abspath(banco)
+        self.diretorio = os.path.dirname(self.banco)
+        self.identificador = ("sqlite", self.banco)
+        # As gravações já são transações; a trava só serve a quem lê e depois grava (ver trava())
+        self._trava_escrita = _travas_escrita().setdefault(self.identificador, TravaEscrita(os.path.join(self.diretorio, TRAVA_ESCRITA)))
+        self._tabelas_prontas = set()
+
+    def _conectar(self):
+        conexao = sqlite3.connect(self.banco, timeout=30)
+        conexao.execute("PRAGMA journal_mode=WAL")
+        conexao.execute("CREATE TABLE IF NOT EXISTS _versoes (tabela TEXT PRIMARY KEY, versao INTEGER NOT NULL)")
+        return conexao
+
+    def _colunas_existentes(self, conexao, nome):
+        return [linha[1] for linha in conexao.execute(f'PRAGMA table_info("{nome}")')]
+
+    def _preparar(self, conexao, tabela, colunas):
+        nome = nome_tabela(tabela)
+        if (nome, tuple(colunas)) in self._tabelas_prontas:
+            return nome
+        existentes = self._colunas_existentes(conexao, nome)
+        if not existentes and colunas:
+            definicao = ", ".join(f'"{col}" TEXT NOT NULL DEFAULT \'\'' for col in colunas)
+            conexao.execute(f'CREATE TABLE IF NOT EXISTS "{nome}" ({definicao})')
+            existentes = list(colunas)
+        for col in colunas:
+            if col not in existentes:
+                conexao.execute(f'ALTER TABLE "{nome}" ADD COLUMN "{col}" TEXT NOT NULL DEFAULT \'\'')
+                existentes.append(col)
+        for col in COLUNAS_INDEXADAS:
+            if col in existentes:
+                conexao.execute(f'CREATE INDEX IF NOT EXISTS "idx_{nome}_{col}" ON "{nome}" ("{col}")')
+        self._tabelas_prontas.add((nome, tuple(colunas)))
+        return nome
+
+    def _nova_versao(self, conexao, nome):
+        conexao.execute("INSERT INTO _versoes (tabela, versao) VALUES (?, 1) "
+                        "ON CONFLICT(tabela) DO UPDATE SET versao = versao + 1", (nome,))
+
+    def assinatura(self, tabela):
+        conexao = self._conectar()
+        try:
+            linha = conexao.execute("SELECT versao FROM _versoes WHERE tabela = ?", (nome_tabela(tabela),)).fetchone()
+        finally:
+            conexao.close()
+        return (self.banco, linha[0] if linha else 0)
+
+    def trava(self):
+        return self._trava_escrita
+
+    def existe(self, tabela):
+        # A versão só avança com gravações; ler a tabela (que a cria vazia) não conta
+        return self.assinatura(tabela)[1] > 0
+
+    def invalidar(self, tabela):
+        _cache_tabelas().pop((self.banco, nome_tabela(tabela)), None)
+
+    def carregar(self, tabela, colunas, inicio=None, fim=None):
+        with medir(f"carregar {tabela}") as registro:
+            df = self._carregar(tabela, colunas, inicio, fim)
+            registro["linhas"] = len(df)
+        return df
+
+    def _carregar(self, tabela, colunas, inicio, fim):
+        # Cada período consultado (inicio/fim inclusivos, pela coluna "data") fica no cache até a tabela mudar
+        cache = _cache_tabelas()
+        chave = (self.banco, nome_tabela(tabela))
+        periodo = (None if inicio is None else _data_texto(inicio), None if fim is None else _data_texto(fim))
+        conexao = self._conectar()
+        try:
+            nome = self._preparar(conexao, tabela, colunas)
+            linha = conexao.execute("SELECT versao FROM _versoes WHERE tabela = ?", (nome,)).fetchone()
+            versao = linha[0] if linha else 0
+            entrada = cache.get(chave)
+            if entrada is None or entrada[0] != versao:
+                entrada = (versao, {})
+                cache[chave] = entrada
+            if periodo not in entrada[1]:
+                condicoes = [condicao for condicao, valor in zip(['"data" >= ?', '"data" <= ?'], periodo) if valor is not None]
+                consulta = f'SELECT rowid AS _id, * FROM "{nome}"' + (" WHERE " + " AND ".join(condicoes) if condicoes else "")
+                with medir(f"consultar {nome}") as registro:
+                    df_lido = pd.read_sql_query(consulta, conexao, params=[v for v in periodo if v is not None], index_col="_id").fillna('')
+                    registro["linhas"] = len(df_lido)
+                df_lido.index.name = None
+                entrada[1][periodo] = converter(df_lido, tabela)
+                cache[chave] = entrada # De novo, para recontar o tamanho com o novo período
+            df_lido = entrada[1][periodo]
+        finally:
+            conexao.close()
+        return _completar_colunas(df_lido, colunas)
+
+    def _inserir_linhas(self, conexao, nome, linhas):
+        colunas = ", ".join(f'"{col}"' for col in linhas.columns)
+        marcadores = ", ".join("?" for _ in linhas.columns)
+        valores = [tuple(_texto(v) for v in linha) for linha in linhas.itertuples(index=False, name=None)]
+        with medir(f"inserir {nome}") as registro:
+            conexao.executemany(f'INSERT INTO "{nome}" ({colunas}) VALUES ({marcadores})', valores)
+            registro.update(linhas=len(valores), bytes=sum(len(v.encode()) for linha in valores for v in linha))
+
+    def _transacao(self, tabela, colunas, operacao):
+        conexao = self._conectar()
+        try:
+            with medir(f"gravar {tabela}"), conexao:
+                nome = self._preparar(conexao, tabela, colunas)
+                operacao(conexao, nome)
+                self._nova_versao(conexao, nome)
+        finally:
+            conexao.close()
+        self.invalidar(tabela)
+
+    def salvar(self, tabela, df):
+        def operacao(conexao, nome):
+            conexao.execute(f'DELETE FROM "{nome}"')
+            self._inserir_linhas(conexao, nome, serializar(df, tabela))
+        self._transacao(tabela, list(df.columns), operacao)
+
+    def inserir(self, tabela, linhas):
+        if linhas.empty:
+            return
+        self._transacao(tabela, list(linhas.columns), lambda conexao, nome: self._inserir_linhas(conexao, nome, serializar(linhas, tabela)))
+
+    def upsert(self, tabela, chave, linhas):
+        def operacao(conexao, nome):
+            condicao = " AND ".join(f'"{col}" = ?' for col in chave)
+            chaves = {tuple(_texto(v) for v in linha) for linha in serializar(linhas[chave], tabela).itertuples(index=False, name=None)}
+            conexao.executemany(f'DELETE FROM "{nome}" WHERE {condicao}', list(chaves))
+            self._inserir_linhas(conexao, nome, serializar(linhas, tabela))
+        self._transacao(tabela, list(linhas.columns), operacao)
+
+    def upsert_dia(self, data, tabelas):
+        # Todas as tabelas do dia numa única transação
+        dia = _data_texto(data)
+        conexao = self._conectar()
+        try:
+            with medir(f"gravar dia {dia}"), conexao:
+                for tabela, linhas in tabelas.items():
+                    linhas = converter(linhas, tabela).assign(data=pd.Timestamp(dia))
+                    nome = self._preparar(conexao, tabela, list(linhas.columns))
+                    conexao.execute(f'DELETE FROM "{nome}" WHERE "data" = ?', (dia,))
+                    self._inserir_linhas(conexao, nome, serializar(linhas, tabela))
+                    self._nova_versao(conexao, nome)
+        finally:
+            conexao.close()
+        for tabela in tabelas:
+            self.invalidar(tabela)
+
+    def alterar_lote(self, tabela, atualizacoes=None, excluidos=(), novas=None, originais=None):
+        # O rowid não muda, mas a linha pode ter sido alterada ou excluída por outra sessão (ver _localizar)
+        atualizacoes = atualizacoes or {}
+        colunas = sorted({coluna for valores in atualizacoes.values() for coluna in valores} | set([] if originais is None else originais.columns))
+        def operacao(conexao, nome):
+            posicoes = {}
+            if atualizacoes or len(excluidos):
+                # O sqlite3 só abre a transação no primeiro UPDATE/DELETE; aberta já aqui, nenhum commit de outra
+                # sessão cai entre a conferência das linhas e a gravação
+                if not conexao.in_transaction:
+                    conexao.execute("BEGIN IMMEDIATE")
+                lidas = ", ".join(["rowid AS _id"] + [f'"{col}"' for col in ([] if originais is None else originais.columns)])
+                atuais = pd.read_sql_query(f'SELECT {lidas} FROM "{nome}"', conexao, index_col="_id").fillna('')
+                posicoes = _localizar(atuais, originais, list(atualizacoes) + list(excluidos), tabela)
+            for indice, valores in atualizacoes.items():
+                atribuicoes = ", ".join(f'"{col}" = ?' for col in valores)
+                novos = serializar(pd.DataFrame([valores]), tabela).iloc[0]
+                conexao.execute(f'UPDATE "{nome}" SET {atribuicoes} WHERE rowid = ?', [_texto(novos[col]) for col in valores] + [int(posicoes[indice])])
+            conexao.executemany(f'DELETE FROM "{nome}" WHERE rowid = ?', [(int(posicoes[i]),) for i in excluidos])
+            if novas is not None and not novas.empty:
+                self._inserir_linhas(conexao, nome, serializar(converter(novas, tabela), tabela))
+        self._transacao(tabela, colunas + ([] if novas is None else list(novas.columns)), operacao)
+
+    def excluir(self, tabela, indices):
+        self.alterar_lote(tabela, excluidos=indices)
+
+    def atualizar(self, tabela, indice, valores):
+        self.alterar_lote(tabela, atualizacoes={indice: valores})
+
+    def migrar_csv(self, diretorio, tabelas):
+        # Importa cada CSV antigo uma única vez (tabelas já presentes no banco são ignoradas)
+        origem = ArmazenamentoCSV(diretorio)
+        conexao = self._conectar()
+        try:
+            pendentes = [t for t in tabelas if not self._colunas_existentes(conexao, nome_tabela(t))]
+        finally:
+            conexao.close()
+        for tabela in pendentes:
+            df = origem.carregar(tabela, [])
+            if not df.empty:
+                self.salvar(tabela, df)
+
+
+@st.cache_resource
+def obter_armazenamento(backend=BACKEND, diretorio=".", tabelas=tuple(TABELAS)):
+    # Uma instância por diretório no processo: sessões do mesmo usuário compartilham caches e travas
+    os.makedirs(diretorio, exist_ok=True)
+    if backend == "sqlite":
+        armazenamento = ArmazenamentoSQLite(os.path.join(diretorio, BANCO_SQLITE))
+        armazenamento.migrar_csv(diretorio, tabelas)
+        return armazenamento
+    if backend == "csv":
+        armazenamento = ArmazenamentoCSV(diretorio)
+        armazenamento.aplicar_pendentes()
+        armazenamento.migrar_particoes()
+        armazenamento.compactar()
+        return armazenamento
+    raise ValueError(f"Backend de armazenamento desconhecido: {backend}")
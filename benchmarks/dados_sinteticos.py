@@ -0,0 +1,74 @@
+import os
+import random
+from datetime import date, timedelta
+import pandas as pd
+from armazenamento import (COLUNAS, AULAS_CSV, EVENTOS_CSV, ATIVIDADES_RECORRENTES_CSV, TAREFAS_CSV, COMPRAS_CSV, ROTINA_MATINAL_CSV,
+                           HABITOS_CSV, MEUS_HABITOS_CSV, HABITOS_FEITOS_CSV, DIARIO_CSV)
+from agenda import TIPOS_EVENTOS, TIPOS_RECORRENTES
+
+# --- Dados sintéticos para os benchmarks ---
+# Os arquivos saem no formato original (um CSV por tabela), para que a carga medida inclua
+# a mesma migração que o app faz na primeira execução sobre dados antigos.
+DIAS_SEMANA = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+HABITOS = ["Ler 10 páginas", "Cuidar da pele", "Alongar", "Estudar inglês", "Caminhar", "Tomar vitaminas", "Organizar a mesa", "Dormir cedo"]
+
+# Quantidade de registros por ano de histórico
+POR_ANO = {EVENTOS_CSV: 1000, AULAS_CSV: 60, ATIVIDADES_RECORRENTES_CSV: 40, TAREFAS_CSV: 20, COMPRAS_CSV: 30}
+
+
+def _hora(rng, inicio=6, fim=22):
+    return f"{rng.randint(inicio, fim - 1):02d}:{rng.choice([0, 15, 30, 45]):02d}"
+
+def _somar_hora(hora, minutos):
+    total = min(int(hora[:2]) * 60 + int(hora[3:]) + minutos, 23 * 60 + 59)
+    return f"{total // 60:02d}:{total % 60:02d}"
+
+def _frase(rng, palavras=8):
+    vocabulario = ["hoje", "estudo", "família", "café", "prova", "trabalho", "caminhada", "livro", "projeto", "amigos", "descanso", "aula", "música"]
+    return " ".join(rng.choice(vocabulario) for _ in range(palavras))
+
+def gerar_tabelas(anos, hoje=None, semente=42):
+    rng = random.Random(semente)
+    hoje = hoje or date.today()
+    dias = [hoje - timedelta(days=n) for n in range(anos * 365)][::-1]
+    datas = [dia.isoformat() for dia in dias]
+
+    eventos = []
+    for _ in range(POR_ANO[EVENTOS_CSV] * anos):
+        # Histórico inteiro e mais um ano à frente, metade com horário
+        dia = hoje + timedelta(days=rng.randint(-anos * 365, 365))
+        inicio = _hora(rng) if rng.random() < 0.5 else ""
+        eventos.append([dia.isoformat(), rng.choice(TIPOS_EVENTOS), _frase(rng, 3), _frase(rng), inicio, _somar_hora(inicio, 60) if inicio else ""])
+
+    aulas = []
+    for n in range(POR_ANO[AULAS_CSV] * anos):
+        inicio = _hora(rng, 7, 21)
+        aulas.append([f"Disciplina {n // 3}", str(rng.randint(100, 400)), rng.choice(DIAS_SEMANA[:5]), inicio, _somar_hora(inicio, 100)])
+
+    atividades = []
+    for _ in range(POR_ANO[ATIVIDADES_RECORRENTES_CSV] * anos):
+        inicio = _hora(rng)
+        atividades.append([_frase(rng, 2), rng.choice(TIPOS_RECORRENTES), rng.choice(DIAS_SEMANA), inicio, _somar_hora(inicio, 45) if rng.random() < 0.7 else ""])
+
+    tabelas = {
+        AULAS_CSV: aulas,
+        EVENTOS_CSV: eventos,
+        ATIVIDADES_RECORRENTES_CSV: atividades,
+        TAREFAS_CSV: [[rng.choice(DIAS_SEMANA), _frase(rng, 2)] for _ in range(POR_ANO[TAREFAS_CSV] * anos)],
+        COMPRAS_CSV: [[f"Item {n}", rng.random() < 0.3] for n in range(POR_ANO[COMPRAS_CSV] * anos)],
+        ROTINA_MATINAL_CSV: [[data] + [rng.random() < 0.7 for _ in range(4)] for data in datas],
+        HABITOS_CSV: [[data, rng.choice(range(0, 3500, 250))] for data in datas],
+        MEUS_HABITOS_CSV: [[habito] for habito in HABITOS],
+        HABITOS_FEITOS_CSV: [[data, habito, rng.random() < 0.6] for data in datas for habito in HABITOS],
+        DIARIO_CSV: [[data, _frase(rng), _frase(rng), _frase(rng), _frase(rng, 20)] for data in datas if rng.random() < 0.8],
+    }
+    return {tabela: pd.DataFrame(linhas, columns=COLUNAS[tabela]) for tabela, linhas in tabelas.items()}
+
+def gerar(diretorio, anos, hoje=None, semente=42):
+    # Grava as dez tabelas em `diretorio` e devolve o número de linhas de cada uma
+    os.makedirs(diretorio, exist_ok=True)
+    linhas = {}
+    for tabela, df in gerar_tabelas(anos, hoje, semente).items():
+        df.to_csv(os.path.join(diretorio, tabela), index=False)
+        linhas[tabela] = len(df)
+    return linhas
@@ -0,0 +1,191 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+import numpy as np
+
+# Uso (a partir da raiz do repositório):
+#   python -m benchmarks.executar --anos 1 5 10 --saida benchmarks/resultado.json
+#   python -m benchmarks.executar --backend sqlite --comparar benchmarks/resultado.json
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(RAIZ, "app.py")
+SECOES_CADASTROS = ["Aulas", "Compromissos", "Tarefas da Casa", "Checklist de Hábitos (sem horário)"]
+
+
+# --- Ações medidas ---
+# Cada ação recebe o AppTest já na página certa e devolve o AppTest depois do rerun que ela provoca
+def _clicar(at, rotulo):
+    [botao for botao in at.button if botao.label == rotulo][0].click()
+    return at.run()
+
+def _abrir(at):
+    return at.run()
+
+def _salvar_autocuidado(at):
+    at.checkbox[0].set_value(not at.checkbox[0].value)
+    return _clicar(at, "Salvar Autocuidado")
+
+def _salvar_reflexao(at):
+    [campo for campo in at.text_input if campo.label.startswith("Pelo que")][0].input(f"benchmark {time.time()}")
+    return _clicar(at, "Salvar Reflexão")
+
+def _agendar_tarefa(at):
+    at.text_input[0].input(f"tarefa {time.time()}")
+    return _clicar(at, "Agendar Tarefa")
+
+def _buscar(at):
+    at.text_input[0].input("prova")
+    return at.run()
+
+def _limpar_comprados(at):
+    if at.checkbox:
+        at.checkbox[0].check()
+        at.run()
+    return _clicar(at, "Limpar itens comprados")
+
+# (página, seção de Cadastros, nome da ação, função)
+CENARIOS = [
+    ("Hoje", None, "abrir", _abrir),
+    ("Hoje", None, "Salvar Autocuidado", _salvar_autocuidado),
+    ("Hoje", None, "Salvar Reflexão", _salvar_reflexao),
+    ("Calendário", None, "abrir", _abrir),
+    *[("Cadastros", secao, "abrir", _abrir) for secao in SECOES_CADASTROS],
+    ("Cadastros", "Tarefas da Casa", "Agendar Tarefa", _agendar_tarefa),
+    ("Lista de Compras", None, "abrir", _abrir),
+    ("Lista de Compras", None, "Limpar itens comprados", _limpar_comprados),
+    ("Estatísticas", None, "abrir", _abrir),
+    ("Busca", None, "abrir", _abrir),
+    ("Busca", None, "buscar", _buscar),
+]
+
+
+# --- Medição ---
+def _ir_para(at, pagina, secao):
+    at.sidebar.radio[0].set_value(pagina)
+    at.run()
+    if secao:
+        at.selectbox[0].set_value(secao)
+        at.run()
+    return at
+
+def _verificar(at, cenario):
+    if at.exception:
+        raise RuntimeError(f"{cenario}: {at.exception[0].value}")
+
+def _percentil(amostras, p):
+    return round(float(np.percentile(amostras, p)), 2)
+
+def medir_cenario(at, pagina, secao, acao, funcao, repeticoes):
+    nome = " / ".join(parte for parte in (pagina, secao, acao) if parte)
+    tempos = []
+    for _ in range(repeticoes):
+        _ir_para(at, pagina, secao)
+        inicio = time.perf_counter()
+        funcao(at)
+        tempos.append((time.perf_counter() - inicio) * 1000)
+        _verificar(at, nome)
+    # Memória numa execução à parte: o tracemalloc deixa o Python bem mais lento e distorceria os tempos
+    _ir_para(at, pagina, secao)
+    tracemalloc.start()
+    try:
+        funcao(at)
+        pico = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    _verificar(at, nome)
+    return {"pagina": pagina, "secao": secao, "acao": acao, "repeticoes": repeticoes,
+            "p50_ms": _percentil(tempos, 50), "p95_ms": _percentil(tempos, 95), "max_ms": round(max(tempos), 2),
+            "pico_memoria_mb": round(pico / 2**20, 2)}
+
+def medir_escala(anos, repeticoes, timeout):
+    import streamlit as st
+    from streamlit.testing.v1 import AppTest
+    from benchmarks.dados_sinteticos import gerar
+
+    diretorio = tempfile.mkdtemp(prefix=f"rotina-bench-{anos}a-")
+    linhas = gerar(diretorio, anos)
+    os.chdir(diretorio)
+    # Cada escala começa com os caches vazios, como um processo novo do app
+    st.cache_resource.clear()
+    st.cache_data.clear()
+
+    at = AppTest.from_file(APP, default_timeout=timeout)
+    inicio = time.perf_counter()
+    at.run()
+    primeira_carga = round((time.perf_counter() - inicio) * 1000, 2)
+    _verificar(at, "primeira carga")
+
+    resultados = []
+    for pagina, secao, acao, funcao in CENARIOS:
+        resultado = medir_cenario(at, pagina, secao, acao, funcao, repeticoes)
+        resultados.append(dict(resultado, anos=anos))
+        print(f"{anos:>3} ano(s)  {' / '.join(p for p in (pagina, secao, acao) if p):<60} "
+              f"p50 {resultado['p50_ms']:>9.1f} ms  p95 {resultado['p95_ms']:>9.1f} ms  pico {resultado['pico_memoria_mb']:>7.1f} MB")
+    return {"anos": anos, "linhas": linhas, "primeira_carga_ms": primeira_carga, "diretorio": diretorio}, resultados
+
+
+# --- Comparação entre versões ---
+def _chave(resultado):
+    return (resultado["anos"], resultado["pagina"], resultado["secao"], resultado["acao"])
+
+def comparar(atual, anterior, tolerancia):
+    # Lista os cenários cujo p50 piorou além da tolerância (ex.: 0.2 = 20%)
+    base = {_chave(r): r for r in anterior["resultados"]}
+    regressoes = []
+    for resultado in atual["resultados"]:
+        antes = base.get(_chave(resultado))
+        if antes and antes["p50_ms"] > 0 and resultado["p50_ms"] > antes["p50_ms"] * (1 + tolerancia):
+            regressoes.append((resultado, antes))
+            print(f"REGRESSÃO {' / '.join(str(p) for p in _chave(resultado) if p)}: "
+                  f"p50 {antes['p50_ms']:.1f} -> {resultado['p50_ms']:.1f} ms")
+    return regressoes
+
+def _versao():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark das páginas do app com dados sintéticos.")
+    parser.add_argument("--anos", type=int, nargs="+", default=[1, 5, 10], help="Anos de histórico de cada escala")
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument("--backend", choices=["csv", "sqlite"], default="csv")
+    parser.add_argument("--timeout", type=float, default=300, help="Tempo máximo de cada rerun, em segundos")
+    parser.add_argument("--saida", default=os.path.join(RAIZ, "benchmarks", "resultado.json"))
+    parser.add_argument("--comparar", help="JSON de uma execução anterior para apontar regressões")
+    parser.add_argument("--tolerancia", type=float, default=0.2)
+    args = parser.parse_args()
+    # Precisa estar definido antes do primeiro import de armazenamento (feito pelo gerador e pelo app)
+    os.environ["ROTINA_ARMAZENAMENTO"] = args.backend
+    saida = os.path.abspath(args.saida)
+
+    escalas, resultados = [], []
+    for anos in args.anos:
+        escala, medidas = medir_escala(anos, args.repeticoes, args.timeout)
+        escalas.append(escala)
+        resultados.extend(medidas)
+
+    relatorio = {
+        "versao": _versao(), "data": datetime.now().isoformat(timespec="seconds"), "backend": args.backend,
+        "python": platform.python_version(), "repeticoes": args.repeticoes, "escalas": escalas, "resultados": resultados,
+    }
+    os.makedirs(os.path.dirname(saida), exist_ok=True)
+    with open(saida, "w", encoding="utf-8") as arquivo:
+        json.dump(relatorio, arquivo, ensure_ascii=False, indent=2)
+    print(f"Resultados salvos em {saida}")
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as arquivo:
+            anterior = json.load(arquivo)
+        if comparar(relatorio, anterior, args.tolerancia):
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+import json
+import os
+import re
+import sqlite3
+import pandas as pd
+import streamlit as st
+from perfil import medir
+from armazenamento import serializar, EVENTOS_CSV, DIARIO_CSV, colunas_eventos, colunas_diario
+
+# --- Busca nas Reflexões e nos Compromissos ---
+# Índice invertido do SQLite (FTS5) num arquivo próprio, ao lado dos dados, para os dois backends.
+# Quem grava pelo app indexa só as linhas novas; alterações feitas por outros caminhos (edição em lote,
+# importação .ics) mudam a assinatura da tabela, e a tabela é reindexada na próxima busca.
+ARQUIVO_INDICE = "busca.sqlite"
+TOKENIZADOR = "unicode61 remove_diacritics 2" # "reflexão", "reflexao" e "REFLEXÃO" viram o mesmo termo
+CAMPOS_DIARIO = ["gratidao", "desafio", "aprendizado", "observacao"]
+ROTULO_DIARIO = "Reflexão"
+PESOS = (0, 0, 0, 0, 3.0, 1.0) # bm25 por coluna: o título pesa mais que o texto
+LIMITE_RESULTADOS = 50
+TABELAS_INDEXADAS = {DIARIO_CSV: colunas_diario, EVENTOS_CSV: colunas_eventos}
+
+
+def _documentos(tabela, df):
+    # Um documento por linha: (origem, data, rótulo, hora, título, texto); linhas sem data ou sem texto ficam de fora
+    df = serializar(df, tabela).fillna("").astype(str)
+    if tabela == DIARIO_CSV:
+        texto = pd.Series(["\n".join(campo for campo in campos if campo.strip()) for campos in df[CAMPOS_DIARIO].itertuples(index=False)],
+                          index=df.index, dtype=str)
+        documentos = pd.DataFrame({"origem": tabela, "data": df["data"], "rotulo": ROTULO_DIARIO, "hora": "", "titulo": "", "texto": texto})
+    else:
+        documentos = pd.DataFrame({"origem": tabela, "data": df["data"], "rotulo": df["tipo"], "hora": df["hora_inicio"],
+                                   "titulo": df["titulo"], "texto": df["descricao"]})
+    tem_texto = (documentos["titulo"].str.strip() != "") | (documentos["texto"].str.strip() != "")
+    return documentos[(documentos["data"] != "") & tem_texto]
+
+def _assinatura_texto(assinatura):
+    return json.dumps(assinatura)
+
+def expressao_busca(consulta):
+    # Cada palavra vira um prefixo entre aspas ("calc"* acha "cálculo"); operadores do FTS5 digitados não valem
+    termos = re.findall(r"\w+", consulta)
+    return " ".join(f'"{termo}"*' for termo in termos)
+
+
+class IndiceBusca:
+    def __init__(self, caminho):
+        self.caminho = caminho
+        conexao = self._conectar()
+        try:
+            with conexao:
+                conexao.execute("CREATE VIRTUAL TABLE IF NOT EXISTS documentos USING fts5("
+                                "origem UNINDEXED, data UNINDEXED, rotulo UNINDEXED, hora UNINDEXED, titulo, texto, "
+                                f"tokenize='{TOKENIZADOR}', prefix='2 3')")
+                conexao.execute("CREATE TABLE IF NOT EXISTS sincronizacao (tabela TEXT PRIMARY KEY, assinatura TEXT NOT NULL)")
+        finally:
+            conexao.close()
+
+    def _conectar(self):
+        conexao = sqlite3.connect(self.caminho, timeout=30)
+        conexao.execute("PRAGMA journal_mode=WAL")
+        return conexao
+
+    def _registrada(self, conexao, tabela):
+        linha = conexao.execute("SELECT assinatura FROM sincronizacao WHERE tabela = ?", (tabela,)).fetchone()
+        return linha[0] if linha else None
+
+    def _registrar(self, conexao, tabela, assinatura):
+        conexao.execute("INSERT INTO sincronizacao (tabela, assinatura) VALUES (?, ?) "
+                        "ON CONFLICT(tabela) DO UPDATE SET assinatura = excluded.assinatura", (tabela, _assinatura_texto(assinatura)))
+
+    def _inserir(self, conexao, documentos):
+        conexao.executemany("INSERT INTO documentos (origem, data, rotulo, hora, titulo, texto) VALUES (?, ?, ?, ?, ?, ?)",
+                            documentos.itertuples(index=False, name=None))
+
+    # --- Manutenção ---
+    def sincronizar(self, armazenamento):
+        # Reindexa as tabelas que mudaram desde a última indexação (na primeira vez, todas)
+        conexao = self._conectar()
+        try:
+            for tabela, colunas in TABELAS_INDEXADAS.items():
+                assinatura = armazenamento.assinatura(tabela)
+                if self._registrada(conexao, tabela) == _assinatura_texto(assinatura):
+                    continue
+                with medir(f"busca: indexar {tabela}") as registro, conexao:
+                    documentos = _documentos(tabela, armazenamento.carregar(tabela, colunas))
+                    conexao.execute("DELETE FROM documentos WHERE origem = ?", (tabela,))
+                    self._inserir(conexao, documentos)
+                    self._registrar(conexao, tabela, assinatura)
+                    registro["linhas"] = len(documentos)
+        finally:
+            conexao.close()
+
+    def gravar(self, armazenamento, tabela, linhas, gravacao, por_data=False):
+        # Faz a gravação (gravacao()) e indexa só as linhas dela. Se o índice já estava em dia com a tabela,
+        # continua em dia; senão, a próxima sincronização reindexa a tabela inteira.
+        # por_data=True: as linhas substituem as do mesmo dia (upsert_dia), e os documentos também.
+        # Tudo sob a trava de escrita: outra gravação entre a assinatura de antes e o registro da nova
+        # deixaria o índice "em dia" sem as linhas dela
+        with armazenamento.trava():
+            antes = _assinatura_texto(armazenamento.assinatura(tabela))
+            gravacao()
+            conexao = self._conectar()
+            try:
+                with medir(f"busca: atualizar {tabela}") as registro, conexao:
+                    if self._registrada(conexao, tabela) != antes:
+                        return
+                    documentos = _documentos(tabela, linhas)
+                    if por_data:
+                        conexao.executemany("DELETE FROM documentos WHERE origem = ? AND data = ?",
+                                            [(tabela, data) for data in serializar(linhas[["data"]], tabela)["data"].unique()])
+                    self._inserir(conexao, documentos)
+                    self._registrar(conexao, tabela, armazenamento.assinatura(tabela))
+                    registro["linhas"] = len(documentos)
+            finally:
+                conexao.close()
+
+    # --- Consulta ---
+    def buscar(self, consulta, inicio=None, fim=None, tabelas=None, limite=LIMITE_RESULTADOS):
+        # Resultados por relevância (bm25), com o trecho que casou entre ** **
+        expressao = expressao_busca(consulta)
+        colunas = ["origem", "data", "rotulo", "hora", "titulo", "trecho", "relevancia"]
+        if not expressao:
+            return pd.DataFrame(columns=colunas)
+        condicoes, parametros = ["documentos MATCH ?"], [expressao]
+        if inicio is not None:
+            condicoes.append("data >= ?")
+            parametros.append(pd.Timestamp(inicio).strftime("%Y-%m-%d"))
+        if fim is not None:
+            condicoes.append("data <= ?")
+            parametros.append(pd.Timestamp(fim).strftime("%Y-%m-%d"))
+        if tabelas:
+            condicoes.append(f"origem IN ({', '.join('?' for _ in tabelas)})")
+            parametros.extend(tabelas)
+        consulta_sql = (f"SELECT origem, data, rotulo, hora, titulo, snippet(documentos, -1, '**', '**', ' … ', 16) AS trecho, "
+                        f"bm25(documentos, {', '.join(map(str, PESOS))}) AS relevancia FROM documentos "
+                        f"WHERE {' AND '.join(condicoes)} ORDER BY relevancia LIMIT ?")
+        conexao = self._conectar()
+        try:
+            with medir("busca: consultar") as registro:
+                resultados = pd.read_sql_query(consulta_sql, conexao, params=parametros + [limite])
+                registro["linhas"] = len(resultados)
+        finally:
+            conexao.close()
+        return resultados[colunas]
+
+
+@st.cache_resource
+def obter_indice(diretorio="."):
+    return IndiceBusca(os.path.join(diretorio, ARQUIVO_INDICE))
@@ -0,0 +1,307 @@
+import argparse
+import hashlib
+import re
+from datetime import date, datetime, timedelta, timezone
+import pandas as pd
+from perfil import medir
+from armazenamento import (obter_armazenamento, serializar, AULAS_CSV, EVENTOS_CSV, ATIVIDADES_RECORRENTES_CSV,
+                           colunas_aulas, colunas_eventos, colunas_atividades_recorrentes)
+from agenda import TIPOS_EVENTOS, TIPOS_RECORRENTES
+
+# --- Calendários .ics (RFC 5545) ---
+# A importação lê o arquivo linha a linha e só guarda as linhas já convertidas para as tabelas;
+# a exportação devolve um gerador de linhas, que pode ir direto para um arquivo.
+DIAS_ICS = {"MO": "Monday", "TU": "Tuesday", "WE": "Wednesday", "TH": "Thursday", "FR": "Friday", "SA": "Saturday", "SU": "Sunday"}
+ICS_DIAS = {dia: sigla for sigla, dia in DIAS_ICS.items()}
+CATEGORIA_AULA = "Aula"
+TIPO_EVENTO_PADRAO = "Lembrete"
+TIPO_RECORRENTE_PADRAO = "Outro"
+LOTE_PROGRESSO = 500 # Eventos lidos entre uma atualização de progresso e a próxima
+LARGURA_LINHA = 75 # Octetos por linha antes de dobrar
+PRODID = "-//Minha Rotina//Rotina//PT-BR"
+DURACAO = re.compile(r"^([+-])?P(?:(\d+)W)?(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?$")
+
+
+# --- Leitura ---
+def _linhas(arquivo):
+    # Desfaz as linhas dobradas (continuação começa com espaço ou tab)
+    atual = None
+    for bruta in arquivo:
+        linha = (bruta.decode("utf-8", errors="replace") if isinstance(bruta, bytes) else bruta).rstrip("\r\n")
+        if linha[:1] in (" ", "\t"):
+            if atual is not None:
+                atual += linha[1:]
+            continue
+        if atual is not None:
+            yield atual
+        atual = linha
+    if atual:
+        yield atual
+
+def _propriedade(linha):
+    # "NOME;PARAM=valor:VALOR" -> (NOME, {PARAM: valor}, VALOR); os dois-pontos entre aspas não contam
+    posicao = linha.find(":")
+    if posicao < 0:
+        return None
+    if '"' in linha[:posicao]:
+        aspas = False
+        for posicao, caractere in enumerate(linha):
+            if caractere == '"':
+                aspas = not aspas
+            elif caractere == ":" and not aspas:
+                break
+        else:
+            return None
+    nome, *parametros = linha[:posicao].split(";")
+    parametros = dict(parametro.split("=", 1) for parametro in parametros if "=" in parametro)
+    return nome.upper(), {chave.upper(): valor.strip('"') for chave, valor in parametros.items()}, linha[posicao + 1:]
+
+def eventos_ics(arquivo):
+    # Gera um dicionário {NOME: (parâmetros, valor)} por VEVENT; componentes internos (VALARM) são pulados
+    evento, aninhados = None, 0
+    for linha in _linhas(arquivo):
+        propriedade = _propriedade(linha)
+        if propriedade is None:
+            continue
+        nome, parametros, valor = propriedade
+        if nome == "BEGIN":
+            if evento is not None:
+                aninhados += 1
+            elif valor.upper() == "VEVENT":
+                evento, aninhados = {}, 0
+        elif nome == "END":
+            if aninhados:
+                aninhados -= 1
+            elif evento is not None and valor.upper() == "VEVENT":
+                yield evento
+                evento = None
+        elif evento is not None and not aninhados:
+            if nome == "CATEGORIES" and nome in evento: # Pode se repetir; as listas são somadas
+                evento[nome] = (parametros, evento[nome][1] + "," + valor)
+            else:
+                evento.setdefault(nome, (parametros, valor))
+
+def _texto_ics(valor):
+    return re.sub(r"\\([\\;,nN])", lambda m: "\n" if m.group(1) in "nN" else m.group(1), valor).strip()
+
+def _momento(parametros, valor):
+    # (data, "HH:MM"); datas sem horário (dia inteiro) vêm com hora vazia. Horários em UTC vão para o fuso local;
+    # com TZID, fica o horário de parede, já que o app não guarda fusos
+    valor = valor.strip()
+    dia = date(int(valor[:4]), int(valor[4:6]), int(valor[6:8]))
+    if parametros.get("VALUE", "").upper() == "DATE" or len(valor) == 8:
+        return dia, ""
+    if valor[8:9] != "T" or not valor[9:15].isdigit():
+        raise ValueError(f"Data e hora inválidas: {valor}")
+    momento = datetime(dia.year, dia.month, dia.day, int(valor[9:11]), int(valor[11:13]), int(valor[13:15]))
+    if valor.endswith("Z"):
+        momento = momento.replace(tzinfo=timezone.utc).astimezone().replace(tzinfo=None)
+    return momento.date(), momento.strftime("%H:%M")
+
+def _duracao(valor):
+    partes = DURACAO.match(valor.strip())
+    if not partes:
+        return None
+    semanas, dias, horas, minutos, segundos = (int(parte or 0) for parte in partes.groups()[1:])
+    duracao = timedelta(weeks=semanas, days=dias, hours=horas, minutes=minutos, seconds=segundos)
+    return -duracao if partes.group(1) == "-" else duracao
+
+def _fim(evento, data, hora_inicio):
+    # Término no mesmo dia; se o evento passa da meia-noite, vai até 23:59
+    if not hora_inicio:
+        return ""
+    if "DTEND" in evento:
+        data_fim, hora_fim = _momento(*evento["DTEND"])
+    elif "DURATION" in evento and _duracao(evento["DURATION"][1]) is not None:
+        momento = datetime.combine(data, datetime.strptime(hora_inicio, "%H:%M").time()) + _duracao(evento["DURATION"][1])
+        data_fim, hora_fim = momento.date(), momento.strftime("%H:%M")
+    else:
+        return ""
+    if data_fim > data:
+        return "23:59"
+    return hora_fim if data_fim == data and hora_fim > hora_inicio else ""
+
+def _categorias(evento):
+    return [categoria.strip() for categoria in _texto_ics(evento.get("CATEGORIES", ({}, ""))[1]).split(",") if categoria.strip()]
+
+def _escolher_tipo(categorias, tipos, padrao):
+    return next((categoria for categoria in categorias if categoria in tipos), padrao)
+
+def _regra(evento):
+    return dict(parte.split("=", 1) for parte in evento["RRULE"][1].upper().split(";") if "=" in parte)
+
+def _encerrada(regra, data, dias, hoje):
+    # Recorrência que já terminou (UNTIL ou COUNT no passado) não vira compromisso semanal sem fim
+    if "UNTIL" in regra:
+        return _momento({}, regra["UNTIL"])[0] < hoje
+    if "COUNT" in regra and regra["COUNT"].isdigit():
+        semanas = -(-int(regra["COUNT"]) // len(dias))
+        return data + timedelta(weeks=semanas) < hoje
+    return False
+
+def converter_evento(evento, semanais_como=ATIVIDADES_RECORRENTES_CSV, hoje=None):
+    # Devolve (tabela, linhas) ou None para o que o app não representa
+    if "DTSTART" not in evento or "RECURRENCE-ID" in evento or evento.get("STATUS", ({}, ""))[1].upper() == "CANCELLED":
+        return None
+    data, hora_inicio = _momento(*evento["DTSTART"])
+    hora_fim = _fim(evento, data, hora_inicio)
+    titulo = _texto_ics(evento.get("SUMMARY", ({}, ""))[1])
+    categorias = _categorias(evento)
+
+    if "RRULE" not in evento:
+        tipo = _escolher_tipo(categorias, TIPOS_EVENTOS, TIPO_EVENTO_PADRAO)
+        descricao = _texto_ics(evento.get("DESCRIPTION", ({}, ""))[1])
+        return EVENTOS_CSV, [[data.isoformat(), tipo, titulo, descricao, hora_inicio, hora_fim]]
+
+    # Só repetições semanais (o único tipo que as tabelas guardam), uma linha por dia da semana
+    regra = _regra(evento)
+    if regra.get("FREQ") != "WEEKLY" or regra.get("INTERVAL", "1") != "1":
+        return None
+    dias = [DIAS_ICS[dia[-2:]] for dia in regra.get("BYDAY", "").split(",") if dia[-2:] in DIAS_ICS] or [list(DIAS_ICS.values())[data.weekday()]]
+    if _encerrada(regra, data, dias, hoje or date.today()):
+        return None
+    # A categoria decide (exportada por este app ou definida no outro calendário); sem ela, vale a escolha de quem importa
+    e_compromisso = any(categoria in TIPOS_RECORRENTES for categoria in categorias)
+    if CATEGORIA_AULA in categorias or (semanais_como == AULAS_CSV and hora_inicio and not e_compromisso):
+        sala = _texto_ics(evento.get("LOCATION", ({}, ""))[1])
+        return AULAS_CSV, [[titulo, sala, dia, hora_inicio, hora_fim] for dia in dias]
+    tipo = _escolher_tipo(categorias, TIPOS_RECORRENTES, TIPO_RECORRENTE_PADRAO)
+    return ATIVIDADES_RECORRENTES_CSV, [[titulo, tipo, dia, hora_inicio, hora_fim] for dia in dias]
+
+
+# --- Importação ---
+COLUNAS_IMPORTACAO = {EVENTOS_CSV: colunas_eventos, AULAS_CSV: colunas_aulas, ATIVIDADES_RECORRENTES_CSV: colunas_atividades_recorrentes}
+
+def _sem_repetidas(armazenamento, tabela, linhas):
+    # Tira o que já está gravado e o que se repete dentro do próprio arquivo
+    colunas = COLUNAS_IMPORTACAO[tabela]
+    df = pd.DataFrame(linhas, columns=colunas)
+    vistas = set(serializar(armazenamento.carregar(tabela, colunas)[colunas], tabela).astype(str).itertuples(index=False, name=None))
+    manter = []
+    for chave in serializar(df, tabela).astype(str).itertuples(index=False, name=None):
+        manter.append(chave not in vistas)
+        vistas.add(chave)
+    return df.loc[manter]
+
+def importar(armazenamento, arquivo, tamanho=None, semanais_como=ATIVIDADES_RECORRENTES_CSV, progresso=None):
+    # Lê o arquivo inteiro e grava cada tabela de uma vez só (uma reescrita ou uma transação por tabela).
+    # progresso(fração, lidos) é chamado a cada LOTE_PROGRESSO eventos; repetições do que já existe são puladas.
+    novas = {tabela: [] for tabela in COLUNAS_IMPORTACAO}
+    lidos, ignorados = 0, 0
+    with medir("ics: ler arquivo") as registro:
+        for evento in eventos_ics(arquivo):
+            lidos += 1
+            try:
+                convertido = converter_evento(evento, semanais_como)
+            except ValueError:
+                convertido = None
+            if convertido is None:
+                ignorados += 1
+            else:
+                novas[convertido[0]].extend(convertido[1])
+            if progresso and lidos % LOTE_PROGRESSO == 0:
+                progresso(min(arquivo.tell() / tamanho, 1.0) if tamanho else None, lidos)
+        registro["linhas"] = lidos
+
+    resultado = {"lidos": lidos, "ignorados": ignorados, "repetidos": 0}
+    for tabela, linhas in novas.items():
+        df = _sem_repetidas(armazenamento, tabela, linhas)
+        armazenamento.inserir(tabela, df)
+        resultado[tabela] = len(df)
+        resultado["repetidos"] += len(linhas) - len(df)
+    if progresso:
+        progresso(1.0, lidos)
+    return resultado
+
+
+# --- Exportação ---
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\r\n", "\\n").replace("\n", "\\n")
+
+def _linha(nome, valor):
+    # Dobra em LARGURA_LINHA octetos sem cortar caracteres multibyte
+    linha = f"{nome}:{valor}"
+    partes, atual, tamanho = [], "", 0
+    for caractere in linha:
+        octetos = len(caractere.encode("utf-8"))
+        if tamanho + octetos > LARGURA_LINHA - (1 if partes else 0):
+            partes.append(atual)
+            atual, tamanho = "", 0
+        atual += caractere
+        tamanho += octetos
+    partes.append(atual)
+    return "\r\n ".join(partes) + "\r\n"
+
+def _uid(tabela, linha):
+    return hashlib.sha1("|".join([tabela, *map(str, linha)]).encode("utf-8")).hexdigest()[:20] + "@rotina"
+
+def _data_hora(data, hora):
+    return data.strftime("%Y%m%d") + "T" + hora.replace(":", "") + "00"
+
+def _vevento(tabela, linha, data, hora_inicio, hora_fim, propriedades, carimbo, regra=None):
+    yield "BEGIN:VEVENT\r\n"
+    yield _linha("UID", _uid(tabela, linha))
+    yield _linha("DTSTAMP", carimbo)
+    if hora_inicio:
+        yield _linha("DTSTART", _data_hora(data, hora_inicio))
+        if hora_fim and hora_fim > hora_inicio:
+            yield _linha("DTEND", _data_hora(data, hora_fim))
+    else:
+        yield _linha("DTSTART;VALUE=DATE", data.strftime("%Y%m%d"))
+        yield _linha("DTEND;VALUE=DATE", (data + timedelta(days=1)).strftime("%Y%m%d"))
+    if regra:
+        yield _linha("RRULE", regra)
+    for nome, valor in propriedades:
+        if valor:
+            yield _linha(nome, _escapar(valor))
+    yield "END:VEVENT\r\n"
+
+def exportar(armazenamento, hoje=None):
+    # As recorrências saem como RRULE semanal a partir da semana atual: o calendário de destino expande as ocorrências
+    carimbo = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    hoje = hoje or date.today()
+    inicio_semana = hoje - timedelta(days=hoje.weekday())
+    yield "BEGIN:VCALENDAR\r\nVERSION:2.0\r\n" + _linha("PRODID", PRODID) + "CALSCALE:GREGORIAN\r\n"
+
+    eventos = armazenamento.carregar(EVENTOS_CSV, colunas_eventos).dropna(subset=["data"])
+    for linha in serializar(eventos[colunas_eventos], EVENTOS_CSV).itertuples(index=False):
+        yield from _vevento(EVENTOS_CSV, linha, date.fromisoformat(linha.data), linha.hora_inicio, linha.hora_fim,
+                            [("SUMMARY", linha.titulo), ("DESCRIPTION", linha.descricao), ("CATEGORIES", linha.tipo)], carimbo)
+
+    semanais = [
+        (AULAS_CSV, colunas_aulas, lambda linha: [("SUMMARY", linha.disciplina), ("LOCATION", linha.sala), ("CATEGORIES", CATEGORIA_AULA)]),
+        (ATIVIDADES_RECORRENTES_CSV, colunas_atividades_recorrentes, lambda linha: [("SUMMARY", linha.titulo), ("CATEGORIES", linha.tipo)]),
+    ]
+    for tabela, colunas, propriedades in semanais:
+        for linha in serializar(armazenamento.carregar(tabela, colunas)[colunas], tabela).itertuples(index=False):
+            if linha.dia_semana not in ICS_DIAS:
+                continue
+            data = inicio_semana + timedelta(days=list(ICS_DIAS).index(linha.dia_semana))
+            yield from _vevento(tabela, linha, data, linha.hora_inicio, linha.hora_fim, propriedades(linha), carimbo,
+                                regra=f"FREQ=WEEKLY;BYDAY={ICS_DIAS[linha.dia_semana]}")
+    yield "END:VCALENDAR\r\n"
+
+
+# --- Linha de comando ---
+# python calendario_ics.py importar calendario.ics [--aulas]
+# python calendario_ics.py exportar minha_rotina.ics
+def main():
+    parser = argparse.ArgumentParser(description="Importa ou exporta os compromissos em formato .ics.")
+    parser.add_argument("acao", choices=["importar", "exportar"])
+    parser.add_argument("arquivo")
+    parser.add_argument("--aulas", action="store_true", help="Repetições semanais sem categoria entram como aulas")
+    parser.add_argument("--diretorio", default=".", help="Diretório de dados do app")
+    args = parser.parse_args()
+    armazenamento = obter_armazenamento(diretorio=args.diretorio)
+
+    if args.acao == "exportar":
+        with open(args.arquivo, "w", encoding="utf-8", newline="") as saida:
+            saida.writelines(exportar(armazenamento))
+        return
+    with open(args.arquivo, "rb") as entrada:
+        resultado = importar(armazenamento, entrada, semanais_como=AULAS_CSV if args.aulas else ATIVIDADES_RECORRENTES_CSV)
+    print(resultado)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+from datetime import timedelta
+import pandas as pd
+from armazenamento import (ROTINA_MATINAL_CSV, HABITOS_CSV, HABITOS_FEITOS_CSV, SEQUENCIAS_CSV, PERIODOS_CSV,
+                           colunas_rotina_matinal, colunas_habitos, colunas_habitos_feitos, colunas_sequencias, colunas_periodos)
+from perfil import medir
+
+# --- Estatísticas de Hábitos ---
+# Agregados materializados em duas tabelas pequenas: a sequência de cada hábito e as contagens por semana e por mês.
+# "Salvar Autocuidado" aplica só a diferença do dia salvo; reconstruir() refaz tudo a partir do histórico quando preciso.
+META_AGUA = 2000 # ml
+HABITO_AGUA = "💧 Meta de água"
+ROTINA = {"cama_arrumada": "🛏️ Arrumar a cama", "dentes_escovados": "🦷 Escovar os dentes", "rosto_lavado": "🧼 Lavar o rosto", "meditacao": "🧘‍♀️ Meditar"}
+UM_DIA = timedelta(days=1)
+
+
+def periodos(data):
+    ano, semana, _ = data.isocalendar()
+    return [f"{ano}-S{semana:02d}", data.strftime("%Y-%m")]
+
+def marcacoes(rotina=None, agua=None, feitos=None):
+    # Junta o dia num só dicionário {hábito: feito}; o que não foi registrado (None) fica de fora
+    marcado = {}
+    if rotina is not None:
+        marcado.update({ROTINA[coluna]: bool(valor) for coluna, valor in rotina.items()})
+    if agua is not None:
+        marcado[HABITO_AGUA] = agua >= META_AGUA
+    marcado.update({habito: bool(feito) for habito, feito in (feitos or {}).items()})
+    return marcado
+
+
+# --- Reconstrução a partir do histórico ---
+def _historico(armazenamento):
+    rotina = armazenamento.carregar(ROTINA_MATINAL_CSV, colunas_rotina_matinal)
+    agua = armazenamento.carregar(HABITOS_CSV, colunas_habitos)
+    feitos = armazenamento.carregar(HABITOS_FEITOS_CSV, colunas_habitos_feitos)
+    partes = [
+        rotina.melt(id_vars="data", var_name="habito", value_name="feito").assign(habito=lambda df: df["habito"].map(ROTINA)),
+        pd.DataFrame({"data": agua["data"], "habito": HABITO_AGUA, "feito": agua["agua"] >= META_AGUA}),
+        feitos[["data", "habito", "feito"]],
+    ]
+    partes = [parte for parte in partes if not parte.empty] or [pd.DataFrame({"data": pd.Series(dtype="datetime64[ns]"), "habito": "", "feito": False})]
+    dias = pd.concat(partes, ignore_index=True).dropna(subset=["data"]).drop_duplicates(["data", "habito"], keep="last")
+    return dias.assign(feito=dias["feito"].astype(bool))
+
+def _sequencias(dias):
+    # Sequências = dias feitos consecutivos; a última de cada hábito é a atual, as outras só contam para o recorde
+    feitos = dias[dias["feito"]].sort_values(["habito", "data"])
+    if feitos.empty:
+        return pd.DataFrame(columns=colunas_sequencias)
+    quebra = (feitos["habito"] != feitos["habito"].shift()) | (feitos["data"].diff() != pd.Timedelta(days=1))
+    trechos = feitos.assign(trecho=quebra.cumsum()).groupby(["habito", "trecho"])["data"].agg(["size", "max"]).reset_index()
+    e_ultimo = trechos["trecho"] == trechos.groupby("habito")["trecho"].transform("max")
+    ultimos = trechos[e_ultimo].set_index("habito")
+    maior_anterior = trechos[~e_ultimo].groupby("habito")["size"].max()
+    return pd.DataFrame({"habito": ultimos.index, "sequencia_atual": ultimos["size"].values, "ultimo_dia": ultimos["max"].values,
+                         "maior_anterior": maior_anterior.reindex(ultimos.index, fill_value=0).values})
+
+def _contagens(dias):
+    semanas = dias["data"].dt.isocalendar()
+    rotulos = [semanas["year"].astype(str) + "-S" + semanas["week"].astype(str).str.zfill(2), dias["data"].dt.strftime("%Y-%m")]
+    partes = [dias.assign(periodo=rotulo).groupby(["periodo", "habito"])["feito"].agg(feitos="sum", registrados="size").reset_index()
+              for rotulo in rotulos]
+    return pd.concat(partes, ignore_index=True)[colunas_periodos]
+
+def reconstruir(armazenamento):
+    with armazenamento.trava(), medir("estatísticas: reconstruir"):
+        dias = _historico(armazenamento)
+        armazenamento.salvar(SEQUENCIAS_CSV, _sequencias(dias))
+        armazenamento.salvar(PERIODOS_CSV, _contagens(dias))
+
+
+# --- Atualização incremental ---
+def _avancar(estado, data, feito):
+    # estado = (sequencia_atual, ultimo_dia, maior_anterior); só vale para o dia mais recente da sequência
+    atual, ultimo, maior_anterior = estado
+    if feito:
+        if ultimo == data:
+            return estado
+        if ultimo == data - UM_DIA:
+            return atual + 1, data, maior_anterior
+        return 1, data, max(maior_anterior, atual)
+    if ultimo == data: # Desmarcado no mesmo dia: desfaz o último passo
+        return atual - 1, (data - UM_DIA if atual > 1 else None), maior_anterior
+    return estado
+
+def _dia_salvo(armazenamento, data):
+    rotina = armazenamento.carregar(ROTINA_MATINAL_CSV, colunas_rotina_matinal, inicio=data, fim=data)
+    agua = armazenamento.carregar(HABITOS_CSV, colunas_habitos, inicio=data, fim=data)
+    feitos = armazenamento.carregar(HABITOS_FEITOS_CSV, colunas_habitos_feitos, inicio=data, fim=data)
+    return marcacoes(rotina.iloc[0][colunas_rotina_matinal[1:]].to_dict() if not rotina.empty else None,
+                     int(agua["agua"].iloc[0]) if not agua.empty else None, dict(zip(feitos["habito"], feitos["feito"])))
+
+def salvar_dia(armazenamento, data, tabelas, depois):
+    # Grava o dia (upsert_dia) e aplica nos agregados a diferença para o que estava salvo, tudo dentro da trava:
+    # o "antes" vem do disco, e não da página, para que duas abas salvando juntas não contem o dia duas vezes
+    data = pd.Timestamp(data).normalize()
+    with armazenamento.trava():
+        antes = _dia_salvo(armazenamento, data)
+        armazenamento.upsert_dia(data, tabelas)
+        _aplicar_diferenca(armazenamento, data, antes, depois)
+
+def _aplicar_diferenca(armazenamento, data, antes, depois):
+    # antes/depois: marcacoes() do dia antes e depois de salvar
+    sequencias = armazenamento.carregar(SEQUENCIAS_CSV, colunas_sequencias).set_index("habito")
+    if not agregados_prontos(armazenamento) or (sequencias["ultimo_dia"] > data).any():
+        # Primeira vez, ou alteração de um dia passado: as sequências não podem ser ajustadas só pela diferença
+        return reconstruir(armazenamento)
+
+    with medir("estatísticas: atualizar dia") as registro:
+        habitos = sorted(set(antes) | set(depois))
+        novas_sequencias = []
+        for habito in habitos:
+            if habito in sequencias.index:
+                linha = sequencias.loc[habito]
+                estado = (int(linha["sequencia_atual"]), None if pd.isna(linha["ultimo_dia"]) else linha["ultimo_dia"], int(linha["maior_anterior"]))
+            else:
+                estado = (0, None, 0)
+            atual, ultimo, maior_anterior = _avancar(estado, data, depois.get(habito, False))
+            novas_sequencias.append([habito, atual, ultimo, maior_anterior])
+        armazenamento.upsert(SEQUENCIAS_CSV, ["habito"], pd.DataFrame(novas_sequencias, columns=colunas_sequencias))
+
+        contagens = armazenamento.carregar(PERIODOS_CSV, colunas_periodos).set_index(["periodo", "habito"])
+        novas_contagens = []
+        for periodo in periodos(data):
+            for habito in habitos:
+                feitos, registrados = contagens.loc[(periodo, habito)] if (periodo, habito) in contagens.index else (0, 0)
+                novas_contagens.append([periodo, habito, int(feitos) + int(depois.get(habito, False)) - int(antes.get(habito, False)),
+                                        int(registrados) + int(habito in depois) - int(habito in antes)])
+        armazenamento.upsert(PERIODOS_CSV, ["periodo", "habito"], pd.DataFrame(novas_contagens, columns=colunas_periodos))
+        registro["linhas"] = len(novas_sequencias) + len(novas_contagens)
+
+
+# --- Leitura para a página ---
+def resumo(armazenamento, habitos, hoje):
+    # Uma linha por hábito, lida só dos agregados: o custo não depende do tamanho do histórico
+    sequencias = armazenamento.carregar(SEQUENCIAS_CSV, colunas_sequencias).set_index("habito")
+    contagens = armazenamento.carregar(PERIODOS_CSV, colunas_periodos).set_index(["periodo", "habito"])
+    hoje = pd.Timestamp(hoje).normalize()
+    semana, mes = periodos(hoje)
+    linhas = []
+    for habito in habitos:
+        atual, maior = 0, 0
+        if habito in sequencias.index:
+            linha = sequencias.loc[habito]
+            # A sequência continua valendo enquanto o dia de hoje ainda pode ser marcado
+            if not pd.isna(linha["ultimo_dia"]) and linha["ultimo_dia"] >= hoje - UM_DIA:
+                atual = int(linha["sequencia_atual"])
+            maior = max(int(linha["sequencia_atual"]), int(linha["maior_anterior"]))
+        taxas = []
+        for periodo in (semana, mes):
+            feitos, registrados = contagens.loc[(periodo, habito)] if (periodo, habito) in contagens.index else (0, 0)
+            taxas.append(feitos / registrados if registrados else None)
+        linhas.append([habito, atual, maior, *taxas])
+    return pd.DataFrame(linhas, columns=["habito", "sequencia_atual", "maior_sequencia", "taxa_semana", "taxa_mes"])
+
+def historico_mensal(armazenamento, habitos, meses=12):
+    # Taxa de conclusão dos últimos meses, no formato de gráfico (meses x hábitos)
+    contagens = armazenamento.carregar(PERIODOS_CSV, colunas_periodos)
+    mensais = contagens[(contagens["periodo"].str.len() == 7) & contagens["habito"].isin(habitos)] # "AAAA-MM"; semanas são "AAAA-Sxx"
+    mensais = mensais[mensais["periodo"].isin(sorted(mensais["periodo"].unique())[-meses:])]
+    taxas = mensais.assign(taxa=mensais["feitos"] / mensais["registrados"].where(mensais["registrados"] > 0))
+    return taxas.pivot(index="periodo", columns="habito", values="taxa")
+
+def agregados_prontos(armazenamento):
+    # reconstruir() sempre grava PERIODOS_CSV, mesmo vazia. Não dá para usar "nenhuma sequência" como sinal:
+    # isso também vale para quem ainda não concluiu nenhum hábito, e cada abertura refaria todo o histórico
+    return armazenamento.existe(PERIODOS_CSV)
+
+def estatisticas_prontas(armazenamento):
+    # Na primeira abertura (ou se os agregados sumirem), monta tudo a partir do histórico
+    if not agregados_prontos(armazenamento):
+        reconstruir(armazenamento)
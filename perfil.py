@@ -0,0 +1,119 @@
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+import pandas as pd
+import streamlit as st
+
+# --- Perfil de cada rerun ---
+# As fases (tempo, linhas e bytes) ficam numa lista do thread que está rodando o script.
+# Só há coleta entre iniciar_rerun() e finalizar_rerun(); fora disso (ex.: reruns de fragmentos) medir() não faz nada.
+# Um rerun que termina em st.rerun() ou st.stop() não chega a finalizar_rerun(): ele fica pendente na sessão
+# e é gravado (e mostrado no painel) pelo iniciar_rerun() seguinte, marcado como interrompido.
+ARQUIVO_LOG = os.environ.get("ROTINA_PERFIL_LOG") # Um JSON por linha, por rerun, para agregar entre sessões
+PARAMETRO_PAINEL = "perfil" # ?perfil=1 na URL mostra o painel na barra lateral
+CHAVE_PENDENTE = "perfil_pendente"
+
+_estado = threading.local()
+
+
+def painel_visivel():
+    return st.query_params.get(PARAMETRO_PAINEL) == "1" or os.environ.get("ROTINA_PERFIL") == "1"
+
+def iniciar_rerun():
+    _estado.interrompido = _descarregar_pendente()
+    _estado.fases = [] if ARQUIVO_LOG or painel_visivel() else None
+    _estado.nivel = 0
+    _estado.inicio = time.perf_counter()
+    if _estado.fases is not None:
+        # Mesma lista das fases: o que for medido até um st.rerun()/st.stop() já está aqui
+        st.session_state[CHAVE_PENDENTE] = {"inicio": _estado.inicio, "fim": _estado.inicio, "pagina": None, "fases": _estado.fases}
+
+def definir_pagina(pagina):
+    # Para identificar o rerun mesmo que ele seja interrompido antes de finalizar_rerun()
+    pendente = st.session_state.get(CHAVE_PENDENTE)
+    if pendente is not None:
+        pendente["pagina"] = pagina
+
+def _descarregar_pendente():
+    pendente = st.session_state.pop(CHAVE_PENDENTE, None)
+    if pendente is None:
+        return None
+    # Sem o fim real do script, o total vai até o fim da última fase medida
+    total = round((pendente["fim"] - pendente["inicio"]) * 1000, 2)
+    _gravar_log(pendente["pagina"], total, pendente["fases"], interrompido=True)
+    return pendente["pagina"], total, pendente["fases"]
+
+@contextmanager
+def medir(fase):
+    # Entrega um registro em que quem mede pode preencher "linhas" e "bytes"
+    fases = getattr(_estado, "fases", None)
+    if fases is None:
+        yield {}
+        return
+    registro = {"fase": fase, "nivel": _estado.nivel, "ms": 0.0, "linhas": 0, "bytes": 0}
+    fases.append(registro)
+    _estado.nivel += 1
+    inicio = time.perf_counter()
+    try:
+        yield registro
+    finally:
+        fim = time.perf_counter()
+        registro["ms"] = round((fim - inicio) * 1000, 2)
+        _estado.nivel -= 1
+        pendente = st.session_state.get(CHAVE_PENDENTE)
+        if pendente is not None and pendente["fases"] is fases:
+            pendente["fim"] = fim
+
+def medido(fase):
+    # Mesma medição como decorador; conta as linhas quando a função devolve um DataFrame ou uma lista
+    def decorador(funcao):
+        @wraps(funcao)
+        def medida(*args, **kwargs):
+            with medir(fase) as registro:
+                resultado = funcao(*args, **kwargs)
+                if isinstance(resultado, (pd.DataFrame, list)):
+                    registro["linhas"] = len(resultado)
+                return resultado
+        return medida
+    return decorador
+
+def _gravar_log(pagina, total, fases, interrompido=False):
+    if not ARQUIVO_LOG:
+        return
+    sessao = st.session_state.setdefault("perfil_sessao", uuid.uuid4().hex)
+    linha = {"momento": datetime.now().isoformat(timespec="milliseconds"), "sessao": sessao, "pagina": pagina, "total_ms": total, "fases": fases}
+    if interrompido:
+        linha["interrompido"] = True
+    with open(ARQUIVO_LOG, "a", encoding="utf-8") as arquivo:
+        arquivo.write(json.dumps(linha, ensure_ascii=False) + "\n")
+
+def _mostrar_fases(titulo, total, fases, rotulo_resto):
+    with st.sidebar.expander(titulo, expanded=True):
+        if fases:
+            df = pd.DataFrame(fases)
+            df["fase"] = df["nivel"].map(lambda nivel: "· " * nivel) + df["fase"]
+            st.dataframe(df[["fase", "ms", "linhas", "bytes"]], hide_index=True)
+        medido_ms = sum(registro["ms"] for registro in fases if registro["nivel"] == 0)
+        st.caption(f"{rotulo_resto}: {total - medido_ms:.0f} ms")
+
+def finalizar_rerun(pagina):
+    fases = getattr(_estado, "fases", None)
+    if fases is None:
+        return
+    _estado.fases = None
+    st.session_state.pop(CHAVE_PENDENTE, None)
+    total = round((time.perf_counter() - _estado.inicio) * 1000, 2)
+    _gravar_log(pagina, total, fases)
+
+    if painel_visivel():
+        interrompido = getattr(_estado, "interrompido", None)
+        if interrompido is not None:
+            pagina_anterior, total_anterior, fases_anteriores = interrompido
+            _mostrar_fases(f"⏱️ Rerun anterior ({pagina_anterior or 'sem página'}, interrompido por st.rerun/st.stop): {total_anterior:.0f} ms",
+                           total_anterior, fases_anteriores, "Fora das fases medidas, até a última delas")
+        _mostrar_fases(f"⏱️ Perfil deste rerun: {total:.0f} ms", total, fases, "Fora das fases medidas (widgets, layout)")